@@ -1,147 +1,404 @@
-from flask import Flask, render_template, request, jsonify, send_file, session
-import csv
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, session, url_for
 import os
 from datetime import datetime, timedelta
+import threading
+import time
 import uuid
+import io
 import json
+import multiprocessing
+import concurrent.futures
+import export_jobs
+import http_cache
+import key_sampler
+import log_writer
+import metrics
 import music_utils
+import practice_log
+import question_tokens
+import shards
+import state_store
+import stats_engine
+import storage
 
 app = Flask(__name__)
-app.secret_key = 'your-secret-key-change-this'  # Change this in production
+app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this')  # Set SECRET_KEY in production
 
 # CSV files for data storage
 CSV_FILE = 'data.csv'
 SESSIONS_FILE = 'sessions.csv'
 STATS_FILE = 'daily_stats.csv'
 
-def init_csv_files():
-    """Initialize all CSV files if they don't exist."""
-    # Main practice data
-    if not os.path.exists(CSV_FILE):
-        with open(CSV_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['timestamp', 'type', 'score', 'difficulty', 'clef', 
-                           'correct_answer', 'user_answer', 'key_signature', 
-                           'time_signature', 'session_id', 'response_time_ms', 'notes'])
-    
-    # Session summaries
-    if not os.path.exists(SESSIONS_FILE):
-        with open(SESSIONS_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['session_id', 'start_time', 'end_time', 'session_type', 
-                           'total_questions', 'correct_answers', 'accuracy', 
-                           'avg_response_time', 'difficulty', 'clef'])
-    
-    # Daily aggregated stats
-    if not os.path.exists(STATS_FILE):
-        with open(STATS_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['date', 'total_sessions', 'total_questions', 'accuracy',
-                           'avg_response_time', 'practice_time_minutes'])
+# Storage backend: 'csv' (the files above) or 'sqlite' (WAL database)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'csv')
+SQLITE_FILE = os.environ.get('SQLITE_FILE', 'practice.db')
+# Columnar archive of rows rotated out of data.csv (see log_archive.py)
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+
+# Per-user shards of the practice log, so dashboards read only the requesting
+# user's rows; the global log is still written for rotation and school-wide stats
+LOG_SHARDS = os.environ.get('LOG_SHARDS', '0') == '1'
+SHARD_DIR = os.environ.get('SHARD_DIR', 'shards')
+SHARD_CACHE_SIZE = int(os.environ.get('SHARD_CACHE_SIZE', 256))
+
+# Practice row durability: 'batched' (write-behind) or 'sync' (write per row)
+LOG_DURABILITY = os.environ.get('LOG_DURABILITY', 'batched')
+LOG_BATCH_ROWS = int(os.environ.get('LOG_BATCH_ROWS', 100))
+LOG_BATCH_MS = int(os.environ.get('LOG_BATCH_MS', 250))
+
+# Per-client state: 'memory' (per process) or 'sqlite' (shared by all workers)
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'memory')
+STATE_FILE = os.environ.get('STATE_FILE', 'state.db')
+QUESTION_TTL = int(os.environ.get('QUESTION_TTL', 3600))
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 24 * 3600))
+
+# Draw key practice questions weighted towards often missed or slow keys ('0' for uniform)
+ADAPTIVE_KEYS = os.environ.get('ADAPTIVE_KEYS', '1') == '1'
+# Most key questions a client may prefetch with /api/key/new?count=N
+KEY_PREFETCH_MAX = int(os.environ.get('KEY_PREFETCH_MAX', 10))
+# Most answers one /api/key/check-batch request may carry, and how old their
+# question tokens may be (answers given offline are synced later)
+KEY_BATCH_MAX = int(os.environ.get('KEY_BATCH_MAX', 100))
+OFFLINE_ANSWER_TTL = int(os.environ.get('OFFLINE_ANSWER_TTL', 7 * 24 * 3600))
+
+# PDF export pool: render processes, queue limit before rejecting, job status lifetime
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', min(2, os.cpu_count() or 1)))
+EXPORT_QUEUE_SIZE = int(os.environ.get('EXPORT_QUEUE_SIZE', 16))
+EXPORT_JOB_TTL = int(os.environ.get('EXPORT_JOB_TTL', 3600))
+EXPORT_TIMEOUT = int(os.environ.get('EXPORT_TIMEOUT', 60))
+# PDFs are rendered in memory; recent ones are kept in a per-process LRU of this size
+EXPORT_MEMORY_MB = int(os.environ.get('EXPORT_MEMORY_MB', 32))
+# Opt-in archive of every PDF in exports/: total size budget and maximum age since last use
+EXPORT_ARCHIVE = os.environ.get('EXPORT_ARCHIVE', '0') == '1'
+EXPORT_CACHE_MB = int(os.environ.get('EXPORT_CACHE_MB', 200))
+EXPORT_CACHE_MAX_AGE = int(os.environ.get('EXPORT_CACHE_MAX_AGE', 7 * 24 * 3600))
+# Most sheets a single bulk export may contain
+BULK_EXPORT_MAX = int(os.environ.get('BULK_EXPORT_MAX', 500))
+
+# Opt-in profiler: keep cProfile dumps of the N slowest sampled requests (0 disables)
+PROFILE_SLOWEST = int(os.environ.get('PROFILE_SLOWEST', 0))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 1.0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+PRACTICE_COLUMNS = practice_log.PRACTICE_COLUMNS
+
+# Per-process request and hot-path timings, served at /metrics
+app_metrics = metrics.Registry('piano')
+request_seconds = app_metrics.histogram('request_duration_seconds', 'Time to handle a request',
+                                        ('method', 'endpoint', 'status'))
+hot_path_seconds = app_metrics.histogram('hot_path_seconds', 'Time spent in instrumented functions',
+                                         ('function',))
+request_profiler = metrics.SlowRequestProfiler(keep=PROFILE_SLOWEST, sample_rate=PROFILE_SAMPLE_RATE,
+                                               directory=PROFILE_DIR)
+
+backend = storage.open_backend(STORAGE_BACKEND, csv_file=CSV_FILE, sessions_file=SESSIONS_FILE,
+                               stats_file=STATS_FILE, sqlite_file=SQLITE_FILE,
+                               archive_dir=ARCHIVE_DIR)
+
+# In-memory views over the practice log, loaded once at startup and then
+# advanced from the reader's checkpoint as rows are appended
+practice_stats = stats_engine.PracticeStats()
+daily_rollup = stats_engine.DailyRollup()
+session_index = stats_engine.SessionIndex(min_questions=5)
+graph_series = stats_engine.GraphSeries()
+key_weights = key_sampler.KeyWeights()
+practice_views = {'stats': practice_stats, 'daily': daily_rollup, 'sessions': session_index,
+                  'keys': key_weights}
+global_views = shards.ViewSet(practice_stats, daily_rollup, session_index, graph_series, key_weights)
+practice_reader = None
+sessions_reader = backend.sessions_reader()
+practice_sync_lock = threading.Lock()
+
+def sync_practice_views():
+    """Fold rows appended since the last read into every view and persist changed days."""
+    if practice_reader is None:
+        wait_for_storage()
+    with practice_sync_lock:
+        for record in practice_reader.read():
+            for view in practice_views.values():
+                view.add(record)
+        for summary in sessions_reader.read():
+            session_index.add_saved(summary)
+            graph_series.add(summary)
+        backend.replace_daily_stats(daily_rollup.take_dirty())
+
+def data_version():
+    """Version of the stored data: the readers' checkpoints, which advance on every
+    practice or session write and are the same in every worker process."""
+    sync_practice_views()
+    if shard_log:
+        return (practice_reader.offset, sessions_reader.offset,
+                shard_log.shard(get_client_id()).version())
+    return (practice_reader.offset, sessions_reader.offset)
+
+def dashboard_views():
+    """The views the dashboard endpoints answer from, brought up to date: the
+    requesting user's shard when logs are sharded, otherwise the global views."""
+    if shard_log:
+        shard = shard_log.shard(get_client_id())
+        shard.sync()
+        return shard.views
+    sync_practice_views()
+    return global_views
+
+def user_vary():
+    """Per-user cache key for the dashboard endpoints when logs are sharded."""
+    return get_client_id()
+
+# Cached, ETag-validated bodies for the read-only dashboard endpoints
+response_cache = http_cache.ResponseCache(version=data_version)
+
+# Write-behind queue for practice rows, flushed on exit and on SIGTERM
+practice_writer = log_writer.PracticeLogWriter(
+    hot_path_seconds.wrap(backend.append_practice, function='append_practice'),
+    mode=LOG_DURABILITY, max_rows=LOG_BATCH_ROWS, max_delay_ms=LOG_BATCH_MS,
+    on_flush=sync_practice_views)
+log_writer.install_shutdown_hooks(practice_writer)
+app_metrics.collector('log_writer', 'Practice log writer counter', practice_writer.metrics)
+
+# Second write-behind queue for (user, row) pairs bound for the user shards
+shard_log = None
+shard_writer = None
+if LOG_SHARDS:
+    shard_log = shards.ShardedPracticeLog(SHARD_DIR, max_loaded=SHARD_CACHE_SIZE)
+    shard_writer = log_writer.PracticeLogWriter(
+        shard_log.append_practice, mode=LOG_DURABILITY, max_rows=LOG_BATCH_ROWS,
+        max_delay_ms=LOG_BATCH_MS)
+    log_writer.install_shutdown_hooks(shard_writer)
+    app_metrics.collector('shard_writer', 'Shard log writer counter', shard_writer.metrics)
+    app_metrics.collector('shards', 'User shard cache counter', shard_log.metrics)
+app_metrics.collector('response_cache', 'Dashboard response cache counter', response_cache.metrics)
+
+def init_storage():
+    """Initialize storage (CSV files or SQLite tables) and load the practice views."""
+    global practice_reader
+    backend.init()
+    practice_reader = backend.bootstrap(practice_views)
+    sync_practice_views()
+
+# Storage is loaded in a background thread so importing the app (and answering
+# the first page load after a cold start) doesn't wait for the practice log
+storage_ready = threading.Event()
+storage_start_lock = threading.Lock()
+storage_thread = None
+storage_error = None
+
+def load_storage():
+    """init_storage() for the background thread, recording any failure."""
+    global storage_error
+    try:
+        init_storage()
+    except Exception as e:
+        storage_error = e
+        app.logger.exception("Failed to load practice storage")
+    finally:
+        storage_ready.set()
+
+def start_storage():
+    """Start loading storage in the background unless it is loading or loaded."""
+    global storage_thread
+    with storage_start_lock:
+        if storage_thread is None and not storage_ready.is_set():
+            storage_thread = threading.Thread(target=load_storage, name='storage-init', daemon=True)
+            storage_thread.start()
+
+def wait_for_storage():
+    """Block until the practice views are loaded, starting the load if needed."""
+    if not storage_ready.is_set():
+        start_storage()
+        storage_ready.wait()
+    if storage_error:
+        raise RuntimeError(f"Practice storage failed to load: {storage_error}")
+
+# Cookie keys from before practice sessions moved server side
+LEGACY_SESSION_KEYS = ('session_id', 'session_start', 'session_questions',
+                       'session_correct', 'session_times')
+
+def current_session():
+    """Get or create the server-side counters of this client's practice session."""
+    client_id = get_client_id()
+    counters = session_store.get(client_id)
+    if counters is None:
+        counters = stats_engine.SessionCounters(str(uuid.uuid4())[:8], datetime.now().isoformat())
+        session_store.set(client_id, counters)
+    return counters
 
 def get_session_id():
     """Get or create session ID for tracking practice sessions."""
-    if 'session_id' not in session:
-        session['session_id'] = str(uuid.uuid4())[:8]
-        session['session_start'] = datetime.now().isoformat()
-        session['session_questions'] = 0
-        session['session_correct'] = 0
-        session['session_times'] = []
-    return session['session_id']
+    return current_session().session_id
+
+def get_client_id():
+    """Get or create a stable id for this browser; it is the only value kept in the cookie."""
+    if 'client_id' not in session:
+        session['client_id'] = uuid.uuid4().hex
+    if 'session_id' in session:
+        for key in LEGACY_SESSION_KEYS:
+            session.pop(key, None)
+    return session['client_id']
 
 def end_session():
     """End current session and save summary."""
-    if 'session_id' in session and session['session_questions'] > 0:
-        accuracy = (session['session_correct'] / session['session_questions']) * 100
-        avg_time = sum(session['session_times']) / len(session['session_times']) if session['session_times'] else 0
-        
-        # Save session summary
-        with open(SESSIONS_FILE, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                session['session_id'],
-                session['session_start'],
-                datetime.now().isoformat(),
-                'key_practice',
-                session['session_questions'],
-                session['session_correct'],
-                round(accuracy, 1),
-                round(avg_time, 0),
-                'mixed',  # difficulty
-                'mixed'   # clef
-            ])
-        
-        # Clear session
-        session.pop('session_id', None)
-        session.pop('session_start', None)
-        session.pop('session_questions', None)
-        session.pop('session_correct', None)
-        session.pop('session_times', None)
+    client_id = get_client_id()
+    counters = session_store.get(client_id)
+    if not counters or counters.questions <= 0:
+        app.logger.warning("No answers to summarize for client %s", client_id)
+        return
+    
+    # Save session summary after its answers
+    practice_writer.flush()
+    summary = session_summary(counters)
+    backend.append_sessions([summary])
+    sync_practice_views()
+    if shard_log:
+        shard_writer.flush()
+        shard_log.append_sessions(client_id, [summary])
+    
+    # Clear session
+    session_store.pop(client_id)
+
+def session_summary(counters):
+    """The sessions row for a finished session, from its counters."""
+    return [
+        counters.session_id,
+        counters.start_time,
+        datetime.now().isoformat(),
+        'key_practice',
+        counters.questions,
+        counters.correct,
+        counters.accuracy(),
+        counters.avg_response_time(),
+        'mixed',  # difficulty
+        'mixed'   # clef
+    ]
 
 def log_practice(practice_type, score, difficulty='', clef='', correct_answer='', 
                 user_answer='', key_signature='', time_signature='', session_id='', 
-                response_time_ms=0, notes=''):
-    """Log practice session to CSV."""
-    with open(CSV_FILE, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            datetime.now().isoformat(),
-            practice_type,
-            score,
-            difficulty,
-            clef,
-            correct_answer,
-            user_answer,
-            key_signature,
-            time_signature,
-            session_id or get_session_id(),
-            response_time_ms,
-            notes
-        ])
+                response_time_ms=0, notes='', client_id=None):
+    """Queue a practice row for storage; the running stats update once it is written.
+    
+    Outside a request (e.g. in an export callback) pass session_id and client_id.
+    """
+    with hot_path_seconds.timer(function='log_practice'):
+        row = practice_row(
+            practice_type, score, difficulty, clef, correct_answer, user_answer,
+            key_signature, time_signature, session_id or get_session_id(), response_time_ms, notes)
+        practice_writer.append(row)
+        if shard_writer:
+            shard_writer.append((client_id or get_client_id(), row))
+
+def practice_row(practice_type, score, difficulty='', clef='', correct_answer='', 
+                 user_answer='', key_signature='', time_signature='', session_id='', 
+                 response_time_ms=0, notes='', timestamp=None):
+    """Build a practice log row, stamped now unless a timestamp is given."""
+    return [
+        timestamp or datetime.now().isoformat(),
+        practice_type,
+        score,
+        difficulty,
+        clef,
+        correct_answer,
+        user_answer,
+        key_signature,
+        time_signature,
+        session_id,
+        response_time_ms,
+        notes
+    ]
+
+def iter_practice_records():
+    """Stream practice records one at a time, handling old and new formats."""
+    return backend.iter_practice()
 
 def parse_csv_safely():
     """Parse CSV handling both old and new formats."""
-    sessions = []
-    if not os.path.exists(CSV_FILE):
-        return sessions
-    
-    with open(CSV_FILE, 'r', newline='') as f:
-        content = f.read().strip()
-        if not content:
-            return sessions
-            
-        lines = content.split('\n')
-        for i, line in enumerate(lines):
-            if i == 0:  # Skip header
-                continue
-            
-            parts = line.split(',')
-            if len(parts) >= 5:  # Minimum required fields
-                # Create a standardized record
-                record = {
-                    'timestamp': parts[0] if len(parts) > 0 else '',
-                    'type': parts[1] if len(parts) > 1 else '',
-                    'score': parts[2] if len(parts) > 2 else '0',
-                    'difficulty': parts[3] if len(parts) > 3 else '',
-                    'clef': parts[4] if len(parts) > 4 else '',
-                    'correct_answer': parts[5] if len(parts) > 5 else '',
-                    'user_answer': parts[6] if len(parts) > 6 else '',
-                    'key_signature': parts[7] if len(parts) > 7 else '',
-                    'time_signature': parts[8] if len(parts) > 8 else '',
-                    'session_id': parts[9] if len(parts) > 9 else '',
-                    'response_time_ms': parts[10] if len(parts) > 10 else '0',
-                    'notes': parts[11] if len(parts) > 11 else ''
-                }
-                sessions.append(record)
-    
-    return sessions
-
-# Initialize CSV files on startup
-init_csv_files()
-
-# Global variable to store current key for practice
-current_key = None
-key_start_time = None
+    with hot_path_seconds.timer(function='parse_csv_safely'):
+        return [record._asdict() for record in iter_practice_records()]
+
+# Initialize storage on startup, without blocking the import. Export pool processes
+# re-import the main module when run as `python app.py`; they only render PDFs.
+if multiprocessing.parent_process() is None:
+    start_storage()
+
+# Current practice session counters for each client, keyed by client id
+session_store = state_store.open_store(STATE_BACKEND, table='sessions', path=STATE_FILE,
+                                       ttl=SESSION_TTL, encode=stats_engine.SessionCounters.to_list,
+                                       decode=stats_engine.SessionCounters.from_list)
+
+# Current practice question for each client, keyed by client id
+question_store = state_store.open_store(STATE_BACKEND, table='questions', path=STATE_FILE,
+                                        ttl=QUESTION_TTL)
+
+# Signed question tokens, so prefetched questions can be answered without stored state
+question_signer = question_tokens.QuestionSigner(app.secret_key, ttl=QUESTION_TTL)
+
+# Signatures of answered tokens, kept as long as a token can be accepted, so each
+# question is answered once (per process with the memory store, else by any worker)
+used_tokens = state_store.open_store(STATE_BACKEND, table='used_tokens', path=STATE_FILE,
+                                     maxsize=100000, ttl=OFFLINE_ANSWER_TTL)
+
+def claim_token(token):
+    """Mark a verified token as answered; return its signature, or None if it already was."""
+    signature = str(token).rpartition('.')[2]
+    return signature if used_tokens.add(signature, time.time()) else None
+
+# PDF rendering runs in a process pool; job status is shared through the state store
+pdf_exports = export_jobs.ExportJobs(
+    state_store.open_store(STATE_BACKEND, table='export_jobs', path=STATE_FILE, ttl=EXPORT_JOB_TTL),
+    max_workers=EXPORT_WORKERS, max_pending=EXPORT_QUEUE_SIZE,
+    max_memory_bytes=EXPORT_MEMORY_MB * 1024 * 1024, archive=EXPORT_ARCHIVE,
+    max_cache_bytes=EXPORT_CACHE_MB * 1024 * 1024, max_cache_age=EXPORT_CACHE_MAX_AGE)
+app_metrics.collector('export_jobs', 'PDF export pool counter', pdf_exports.metrics)
+
+def log_export(melody_data, session_id, client_id):
+    """Build the callback that logs a pdf_export row once a render finishes."""
+    def on_done(job):
+        if not job['cached']:
+            hot_path_seconds.observe(job['render_ms'] / 1000, function='create_practice_pdf')
+        log_practice(
+            practice_type='pdf_export',
+            score=1,
+            difficulty=melody_data.get('difficulty', ''),
+            clef=melody_data.get('clef', ''),
+            key_signature=melody_data.get('key_signature', ''),
+            time_signature=melody_data.get('time_signature', ''),
+            session_id=session_id,
+            notes=f"Exported: {job['filename']}",
+            client_id=client_id
+        )
+    return on_done
+
+def queue_full_response(e):
+    """503 with Retry-After when the export queue is saturated."""
+    response = jsonify({'error': f'Export queue is full: {e}'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def export_timeout_response():
+    """504 for an export still rendering after EXPORT_TIMEOUT seconds."""
+    return jsonify({'error': f'Export took longer than {EXPORT_TIMEOUT} seconds'}), 504
+
+@app.before_request
+def start_request_timer():
+    """Time every request, profiling a sample when the profiler is enabled."""
+    g.request_started = time.perf_counter()
+    g.profiler = request_profiler.start()
+
+@app.after_request
+def record_request_timing(response):
+    """Record the request duration and expose it in a Server-Timing header."""
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_seconds.observe(elapsed, method=request.method, endpoint=endpoint,
+                            status=response.status_code)
+    if g.profiler:
+        request_profiler.finish(g.profiler, elapsed, f"{request.method} {endpoint}")
+    response.headers['Server-Timing'] = f"app;dur={elapsed * 1000:.1f}"
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request and hot-path histograms plus writer, cache and export counters."""
+    return Response(app_metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
@@ -160,32 +417,65 @@ def sight_reading():
 
 @app.route('/api/key/new')
 def new_key():
-    """Generate a new random key for practice."""
-    global current_key, key_start_time
-    current_key = music_utils.generate_random_key()
-    key_start_time = datetime.now()
-    return jsonify(current_key)
+    """Generate a new random key for practice, or with ?count=N a batch to prefetch.
+    
+    Every key carries a signed token that /api/key/check accepts in place of
+    the stored current key.
+    """
+    count = request.args.get('count', type=int)
+    weights = None
+    if ADAPTIVE_KEYS:
+        weights = dashboard_views().keys
+    
+    if count is None:
+        current_key = music_utils.generate_random_key(weights)
+        current_key['token'] = question_signer.issue(current_key)
+        question_store.set(get_client_id(), {'key': current_key, 'issued_at': time.time()})
+        return jsonify(current_key)
+    
+    if not 1 <= count <= KEY_PREFETCH_MAX:
+        return jsonify({'error': f'count must be between 1 and {KEY_PREFETCH_MAX}'}), 400
+    
+    issued_at = time.time()
+    questions = []
+    for _ in range(count):
+        key = music_utils.generate_random_key(weights)
+        key['token'] = question_signer.issue(key, issued_at)
+        questions.append(key)
+    return jsonify({'questions': questions})
 
 @app.route('/api/key/check', methods=['POST'])
 def check_key():
     """Check user's key recognition answer."""
-    global current_key, key_start_time
+    data = request.json or {}
+    token = data.get('token')
     
-    if not current_key or not key_start_time:
-        return jsonify({'error': 'No current key'}), 400
+    if token:
+        try:
+            key, issued_at = question_signer.verify(token)
+        except question_tokens.InvalidToken as e:
+            return jsonify({'error': str(e)}), 400
+        current_key = music_utils.key_question(*key)
+    else:
+        question = question_store.get(get_client_id())
+        if not question:
+            return jsonify({'error': 'No current key'}), 400
+        current_key, issued_at = question['key'], question['issued_at']
     
-    user_answer = request.json.get('answer', '').strip()
+    user_answer = str(data.get('answer', '')).strip()
     correct = music_utils.check_key_answer(current_key['note'], user_answer)
     
     # Calculate response time
-    response_time = (datetime.now() - key_start_time).total_seconds() * 1000
+    response_time = measure_response_time(issued_at, data.get('response_time_ms'))
+    
+    # Spend the token last, once nothing about the answer can fail
+    if token and not claim_token(token):
+        return jsonify({'error': 'Question already answered'}), 400
     
-    # Update session counters
-    if 'session_questions' in session:
-        session['session_questions'] += 1
-        session['session_times'].append(response_time)
-        if correct:
-            session['session_correct'] += 1
+    # Update session counters, starting a session on its first answer
+    counters = current_session()
+    counters.add(correct, response_time)
+    session_store.set(get_client_id(), counters)
     
     # Log the practice session with detailed info
     score = 1 if correct else 0
@@ -196,13 +486,14 @@ def check_key():
         clef=current_key['clef'],
         correct_answer=current_key['display_name'],
         user_answer=user_answer,
+        session_id=counters.session_id,
         response_time_ms=round(response_time),
         notes=f"Octave: {current_key['octave']}"
     )
     
     # Check if session should end (10 questions)
     session_complete = False
-    if session.get('session_questions', 0) >= 10:
+    if counters.questions >= 10:
         end_session()
         session_complete = True
     
@@ -212,9 +503,145 @@ def check_key():
         'user_answer': user_answer,
         'response_time': round(response_time),
         'session_complete': session_complete,
-        'session_progress': f"{session.get('session_questions', 0)}/10"
+        'session_progress': f"{0 if session_complete else counters.questions}/10"
+    }
+    
+    return jsonify(response)
+
+def measure_response_time(issued_at, client_time=None, answered_at=None):
+    """Milliseconds from issuing a key to its answer (now, unless answered_at is given).
+    
+    A prefetched key is timed by the client from when it was shown, which is
+    used when it is shorter than the time since the key was issued.
+    """
+    response_time = ((answered_at or time.time()) - issued_at) * 1000
+    if isinstance(client_time, (int, float)) and 0 <= client_time < response_time:
+        response_time = client_time
+    return response_time
+
+@app.route('/api/key/check-batch', methods=['POST'])
+def check_key_batch():
+    """Check a batch of key answers, e.g. given offline and synced later.
+    
+    Each answer carries its question token and optionally the client's
+    response_time_ms and answered_at (epoch milliseconds). Valid answers are
+    appended in one write, and sessions completed along the way are summarized
+    together; invalid ones are reported per answer and not logged. Once the
+    answers are saved the results are returned even if the summaries fail,
+    with summary_error set, so the client doesn't send the batch again.
+    """
+    answers = (request.json or {}).get('answers')
+    if not isinstance(answers, list) or not answers:
+        return jsonify({'error': 'No answers provided'}), 400
+    if len(answers) > KEY_BATCH_MAX:
+        return jsonify({'error': f'At most {KEY_BATCH_MAX} answers per batch'}), 400
+    
+    claimed = []
+    try:
+        client_id = get_client_id()
+        counters = session_store.get(client_id)
+        now = time.time()
+        rows = []
+        finished = []
+        results = []
+        
+        for item in answers:
+            if not isinstance(item, dict):
+                results.append({'error': 'Answer must be an object'})
+                continue
+            try:
+                key, issued_at = question_signer.verify(item.get('token'), ttl=OFFLINE_ANSWER_TTL)
+            except question_tokens.InvalidToken as e:
+                results.append({'error': str(e)})
+                continue
+            # Replayed tokens, from this batch or an earlier one, are rejected
+            signature = claim_token(item.get('token'))
+            if signature is None:
+                results.append({'error': 'Question already answered'})
+                continue
+            claimed.append(signature)
+            current_key = music_utils.key_question(*key)
+            
+            # Client clocks drift, so keep the answer time between issue and now
+            answered_at = item.get('answered_at')
+            if isinstance(answered_at, (int, float)):
+                answered_at = min(max(answered_at / 1000, issued_at), now)
+            else:
+                answered_at = now
+            
+            user_answer = str(item.get('answer', '')).strip()
+            correct = music_utils.check_key_answer(current_key['note'], user_answer)
+            response_time = measure_response_time(issued_at, item.get('response_time_ms'), answered_at)
+            
+            if counters is None:
+                counters = stats_engine.SessionCounters(str(uuid.uuid4())[:8],
+                                                        datetime.fromtimestamp(answered_at).isoformat())
+            counters.add(correct, response_time)
+            rows.append(practice_row(
+                practice_type='key_practice',
+                score=1 if correct else 0,
+                difficulty='beginner',
+                clef=current_key['clef'],
+                correct_answer=current_key['display_name'],
+                user_answer=user_answer,
+                session_id=counters.session_id,
+                response_time_ms=round(response_time),
+                notes=f"Octave: {current_key['octave']}",
+                timestamp=datetime.fromtimestamp(answered_at).isoformat()
+            ))
+            results.append({
+                'correct': correct,
+                'correct_answer': current_key['display_name'],
+                'user_answer': user_answer,
+                'response_time': round(response_time),
+                'session_id': counters.session_id
+            })
+            
+            # Sessions are 10 questions, as with /api/key/check
+            if counters.questions >= 10:
+                finished.append(counters)
+                counters = None
+        
+        # One write (or queued batch) for every answer
+        practice_writer.extend(rows)
+        
+    except Exception as e:
+        # No answer was saved, so the client may send them again
+        for signature in claimed:
+            used_tokens.pop(signature)
+        return jsonify({'error': str(e)}), 500
+    
+    # The answers are saved from here on: their tokens stay claimed, and a failure
+    # below is reported with the results rather than inviting the client to resend
+    if counters is not None:
+        session_store.set(client_id, counters)
+    elif finished:
+        session_store.pop(client_id)
+    
+    response = {
+        'results': results,
+        'accepted': len(rows),
+        'rejected': len(results) - len(rows),
+        'sessions_completed': len(finished),
+        'session_progress': f"{counters.questions if counters else 0}/10"
     }
     
+    try:
+        if shard_writer:
+            shard_writer.extend([(client_id, row) for row in rows])
+        # One write for the completed sessions' summaries
+        if finished:
+            practice_writer.flush()
+            summaries = list(map(session_summary, finished))
+            backend.append_sessions(summaries)
+            sync_practice_views()
+            if shard_log:
+                shard_writer.flush()
+                shard_log.append_sessions(client_id, summaries)
+    except Exception as e:
+        app.logger.exception("Saved %d answers but not their session summaries", len(rows))
+        response['summary_error'] = str(e)
+    
     return jsonify(response)
 
 @app.route('/api/melody/generate', methods=['POST'])
@@ -241,188 +668,263 @@ def generate_melody():
 
 @app.route('/api/melody/export', methods=['POST'])
 def export_melody():
-    """Export melody as PDF."""
+    """Export melody as PDF, waiting for the render in the export pool."""
     melody_data = request.json
     
     if not melody_data:
         return jsonify({'error': 'No melody data provided'}), 400
     
-    # Create exports directory if it doesn't exist
-    os.makedirs('exports', exist_ok=True)
-    
-    # Generate filename
+    # Generate download name
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"practice_sheet_{timestamp}.pdf"
     
     try:
-        # Create PDF
-        music_utils.create_practice_pdf(melody_data, filename)
+        # Render in a pool process (or reuse the cached PDF); this thread waits without holding the GIL
+        job, future = pdf_exports.submit(melody_data, on_done=log_export(melody_data, get_session_id(), get_client_id()))
+        _, _, pdf = future.result(timeout=EXPORT_TIMEOUT)
         
-        # Log the export with detailed info
+        return send_file(io.BytesIO(pdf), mimetype='application/pdf', as_attachment=True,
+                         download_name=filename)
+    
+    except export_jobs.QueueFull as e:
+        return queue_full_response(e)
+    
+    except concurrent.futures.TimeoutError:
+        return export_timeout_response()
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/melody/bulk-export', methods=['POST'])
+def bulk_export():
+    """Generate many melodies and return them as one multi-page PDF or a ZIP."""
+    data = request.json or {}
+    difficulty = data.get('difficulty', 'beginner')
+    clef = data.get('clef', 'treble')
+    fmt = data.get('format', 'pdf')
+    
+    try:
+        count = int(data.get('count', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'count must be an integer'}), 400
+    if not 1 <= count <= BULK_EXPORT_MAX:
+        return jsonify({'error': f'count must be between 1 and {BULK_EXPORT_MAX}'}), 400
+    seed = data.get('seed')
+    if seed is not None:
+        try:
+            seed = int(seed)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'seed must be an integer'}), 400
+    if not isinstance(difficulty, str) or difficulty not in music_utils.DIFFICULTY_SETTINGS:
+        return jsonify({'error': f'Unknown difficulty: {difficulty}'}), 400
+    if not isinstance(clef, str) or clef not in music_utils.CLEFS:
+        return jsonify({'error': f'Unknown clef: {clef}'}), 400
+    if not isinstance(fmt, str) or fmt not in ('pdf', 'zip'):
+        return jsonify({'error': "format must be 'pdf' or 'zip'"}), 400
+    
+    try:
+        with hot_path_seconds.timer(function='render_bulk'):
+            future = pdf_exports.run(export_jobs.render_bulk, count, difficulty, clef, fmt, seed)
+            body = future.result(timeout=EXPORT_TIMEOUT)
+        
+        # One summary row for the whole batch
         log_practice(
-            practice_type='pdf_export',
-            score=1,
-            difficulty=melody_data.get('difficulty', ''),
-            clef=melody_data.get('clef', ''),
-            key_signature=melody_data.get('key_signature', ''),
-            time_signature=melody_data.get('time_signature', ''),
-            notes=f"Exported: {filename}"
+            practice_type='bulk_export',
+            score=count,
+            difficulty=difficulty,
+            clef=clef,
+            notes=f"Exported {count} sheets as {fmt}"
         )
         
-        return send_file(f'exports/{filename}', as_attachment=True, download_name=filename)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return send_file(io.BytesIO(body), as_attachment=True,
+                         mimetype='application/zip' if fmt == 'zip' else 'application/pdf',
+                         download_name=f"practice_sheets_{timestamp}.{fmt}")
+    
+    except export_jobs.QueueFull as e:
+        return queue_full_response(e)
+    
+    except concurrent.futures.TimeoutError:
+        return export_timeout_response()
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def export_job_response(job):
+    """Public view of an export job."""
+    body = {k: job[k] for k in ('job_id', 'status', 'queue_wait_ms', 'render_ms', 'cached', 'error')}
+    body['status_url'] = url_for('export_job_status', job_id=job['job_id'])
+    if job['status'] == 'done':
+        body['download_url'] = url_for('export_job_download', job_id=job['job_id'])
+    return body
+
+@app.route('/api/melody/export-jobs', methods=['POST'])
+def create_export_job():
+    """Queue a PDF export and return its job id immediately."""
+    melody_data = request.json
+    
+    if not melody_data:
+        return jsonify({'error': 'No melody data provided'}), 400
+    
+    try:
+        job, _ = pdf_exports.submit(melody_data, on_done=log_export(melody_data, get_session_id(), get_client_id()))
+        return jsonify(export_job_response(job)), 202
+    
+    except export_jobs.QueueFull as e:
+        return queue_full_response(e)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/melody/export-jobs/<job_id>')
+def export_job_status(job_id):
+    """Get the status of an export job."""
+    job = pdf_exports.status(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown export job'}), 404
+    return jsonify(export_job_response(job))
+
+@app.route('/api/melody/export-jobs/<job_id>/download')
+def export_job_download(job_id):
+    """Download the PDF of a finished export job."""
+    job = pdf_exports.status(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown export job'}), 404
+    if job['status'] != 'done':
+        return jsonify(export_job_response(job)), 409
+    
+    pdf = pdf_exports.read(job)
+    if pdf is None:
+        # Evicted, or rendered by another worker without archiving
+        return jsonify({'error': 'PDF is no longer available, export it again'}), 410
+    
+    timestamp = datetime.fromtimestamp(job['submitted_at']).strftime("%Y%m%d_%H%M%S")
+    return send_file(io.BytesIO(pdf), mimetype='application/pdf', as_attachment=True,
+                     download_name=f"practice_sheet_{timestamp}.pdf")
+
 @app.route('/api/stats')
+@response_cache.cached(vary=lambda: (get_session_id(), current_session().questions))
 def get_stats():
     """Get practice statistics."""
     try:
-        sessions = parse_csv_safely()
+        practice_stats = dashboard_views().stats
         
-        if not sessions:
+        if not practice_stats.rows:
             return jsonify({
                 'total_sessions': 0,
                 'key_practice_accuracy': 0,
                 'treble_accuracy': 0,
                 'bass_accuracy': 0,
                 'avg_response_time': 0,
-                'current_session_progress': session.get('session_questions', 0),
+                'current_session_progress': current_session().questions,
                 'recent_sessions': []
             })
         
-        # Filter different types of sessions
-        key_practice_sessions = [s for s in sessions if s['type'] == 'key_practice']
-        treble_sessions = [s for s in key_practice_sessions if s['clef'] == 'treble']
-        bass_sessions = [s for s in key_practice_sessions if s['clef'] == 'bass']
-        
-        # Calculate overall statistics
-        stats = {
-            'total_sessions': len([s for s in sessions if s['type'] != 'session_start']),
-            'key_practice_accuracy': 0,
-            'treble_accuracy': 0,
-            'bass_accuracy': 0,
-            'avg_response_time': 0,
-            'sight_reading_generated': len([s for s in sessions if s['type'] == 'sight_reading_generated']),
-            'pdfs_exported': len([s for s in sessions if s['type'] == 'pdf_export']),
-            'current_session_id': get_session_id(),
-            'current_session_progress': session.get('session_questions', 0),
-            'recent_sessions': []
-        }
-        
-        # Calculate accuracy metrics
-        if key_practice_sessions:
-            correct_answers = sum(1 for s in key_practice_sessions if s['score'] and float(s['score']) == 1)
-            stats['key_practice_accuracy'] = round((correct_answers / len(key_practice_sessions)) * 100, 1)
-        
-        if treble_sessions:
-            treble_correct = sum(1 for s in treble_sessions if s['score'] and float(s['score']) == 1)
-            stats['treble_accuracy'] = round((treble_correct / len(treble_sessions)) * 100, 1)
-        
-        if bass_sessions:
-            bass_correct = sum(1 for s in bass_sessions if s['score'] and float(s['score']) == 1)
-            stats['bass_accuracy'] = round((bass_correct / len(bass_sessions)) * 100, 1)
-        
-        # Calculate average response time
-        times = [float(s['response_time_ms']) for s in key_practice_sessions 
-                if s['response_time_ms'] and s['response_time_ms'].replace('.', '').isdigit()]
-        if times:
-            stats['avg_response_time'] = round(sum(times) / len(times), 0)
-        
-        # Get recent sessions (last 10, excluding session_start)
-        recent = [s for s in sessions if s['type'] != 'session_start'][-10:]
-        for session_data in recent:
-            stats['recent_sessions'].append({
-                'timestamp': session_data['timestamp'],
-                'type': session_data['type'],
-                'score': session_data['score'],
-                'difficulty': session_data.get('difficulty', ''),
-                'clef': session_data.get('clef', ''),
-                'correct_answer': session_data.get('correct_answer', ''),
-                'user_answer': session_data.get('user_answer', ''),
-                'response_time': session_data.get('response_time_ms', ''),
-                'notes': session_data.get('notes', '')
-            })
+        stats = practice_stats.snapshot()
+        counters = current_session()
+        stats['current_session_id'] = counters.session_id
+        stats['current_session_progress'] = counters.questions
         
         return jsonify(stats)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/daily-stats')
+@response_cache.cached(vary=user_vary if LOG_SHARDS else None)
+def get_daily_stats():
+    """Get per-day totals, optionally limited to ?from=YYYY-MM-DD&to=YYYY-MM-DD."""
+    try:
+        daily_rollup = dashboard_views().daily
+        return jsonify(daily_rollup.range(request.args.get('from'), request.args.get('to')))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/sessions')
+@response_cache.cached(vary=user_vary if LOG_SHARDS else None)
 def get_sessions():
-    """Get session summaries for graphing."""
+    """Get saved and live session summaries, paginated with ?limit=&after=<session_id>."""
     try:
-        sessions = []
-        if os.path.exists(SESSIONS_FILE):
-            with open(SESSIONS_FILE, 'r', newline='') as f:
-                reader = csv.DictReader(f)
-                sessions = list(reader)
+        try:
+            limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        after = request.args.get('after')
         
-        # Also get current live session data
-        live_sessions = parse_csv_safely()
-        key_sessions = [s for s in live_sessions if s['type'] == 'key_practice']
+        session_index = dashboard_views().sessions
+        try:
+            sessions, next_after = session_index.page(after=after, limit=limit)
+        except KeyError:
+            return jsonify({'error': f'Unknown session: {after}'}), 400
         
-        # Group by session_id for live data
-        session_groups = {}
-        for s in key_sessions:
-            sid = s.get('session_id', 'unknown')
-            if sid not in session_groups:
-                session_groups[sid] = []
-            session_groups[sid].append(s)
-        
-        # Convert to session summaries
-        for sid, questions in session_groups.items():
-            if len(questions) >= 5:  # Only include substantial sessions
-                correct = sum(1 for q in questions if q['score'] and float(q['score']) == 1)
-                accuracy = (correct / len(questions)) * 100
-                times = [float(q['response_time_ms']) for q in questions 
-                        if q.get('response_time_ms') and str(q['response_time_ms']).replace('.', '').isdigit()]
-                avg_time = sum(times) / len(times) if times else 0
-                
-                sessions.append({
-                    'session_id': sid,
-                    'start_time': questions[0]['timestamp'],
-                    'end_time': questions[-1]['timestamp'],
-                    'session_type': 'key_practice',
-                    'total_questions': len(questions),
-                    'correct_answers': correct,
-                    'accuracy': round(accuracy, 1),
-                    'avg_response_time': round(avg_time, 0),
-                    'difficulty': 'mixed',
-                    'clef': 'mixed'
-                })
-        
-        return jsonify(sessions)
+        return jsonify({'sessions': sessions, 'next_after': next_after})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/graph-data')
+@response_cache.cached(vary=user_vary if LOG_SHARDS else None)
 def get_graph_data():
-    """Get data formatted for graphs."""
+    """Get data formatted for graphs.
+    
+    Optional ?from=/&to= (YYYY-MM-DD) limit the window, ?group=day|week averages
+    sessions per bucket and ?points=N downsamples to at most N points (LTTB).
+    """
     try:
-        sessions = []
-        if os.path.exists(SESSIONS_FILE):
-            with open(SESSIONS_FILE, 'r', newline='') as f:
-                reader = csv.DictReader(f)
-                sessions = list(reader)
+        graph_series = dashboard_views().graph
+        group = request.args.get('group') or None
+        if group and group not in graph_series.GROUPS:
+            return jsonify({'error': f'Unknown group: {group}'}), 400
+        points = request.args.get('points', type=int)
+        if points is not None and points < 3:
+            return jsonify({'error': 'points must be at least 3'}), 400
         
-        # Format for chart
-        chart_data = []
-        for i, session in enumerate(sessions):
-            chart_data.append({
-                'session': i + 1,
-                'accuracy': float(session.get('accuracy', 0)),
-                'response_time': float(session.get('avg_response_time', 0)),
-                'date': session.get('start_time', '')[:10] if session.get('start_time') else ''
-            })
+        chart_data = graph_series.query(start=request.args.get('from'), end=request.args.get('to'),
+                                        group=group, points=points)
         
         return jsonify(chart_data)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/history/export')
+def export_history():
+    """Stream raw practice history as CSV or NDJSON (?format=csv|ndjson).
+    
+    Filters: ?type=, ?clef= and ?session_id= (comma-separated values) and
+    ?from=/&to= (YYYY-MM-DD, inclusive). Rows are read, filtered and written
+    one chunk at a time, so memory stays flat however long the history is.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': f'Unknown format: {fmt}'}), 400
+    
+    def values(name):
+        return [value for value in request.args.get(name, '').split(',') if value]
+    
+    try:
+        start, end = (datetime.strptime(request.args[name], '%Y-%m-%d').date() if request.args.get(name) else None
+                      for name in ('from', 'to'))
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
+    query = storage.HistoryQuery(types=values('type'), clefs=values('clef'),
+                                 session_ids=values('session_id'), start=start, end=end)
+    
+    try:
+        # Include rows still waiting in the write-behind queue
+        practice_writer.flush()
+        records = backend.iter_history(query)
+        if fmt == 'ndjson':
+            body, mimetype = practice_log.encode_ndjson(records), 'application/x-ndjson'
+        else:
+            body, mimetype = practice_log.encode_csv(records), 'text/csv'
+        return Response(body, mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename=practice_history.{fmt}'})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     # Get port from environment variable (Render sets this)
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script for Piano Practice App
+Synthesizes data.csv / sessions.csv at a chosen size in a scratch directory,
+times the hot functions and drives concurrent load at the API endpoints,
+then writes p50/p95/p99 latency, throughput and peak RSS as a JSON baseline
+that later runs can be compared against.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+import music_utils
+import storage
+
+WRITE_CHUNK = 10000
+
+# Endpoints hit by the load test, with their relative weight
+LOAD_MIX = [
+    ('GET', '/api/stats', None, 4),
+    ('GET', '/api/sessions?limit=50', None, 2),
+    ('GET', '/api/graph-data?points=200', None, 2),
+    ('GET', '/api/daily-stats', None, 1),
+    ('POST', '/api/melody/generate', {'difficulty': 'intermediate', 'clef': 'treble'}, 1),
+]
+
+
+def synthesize(workdir, rows, days, seed):
+    """Write data.csv and sessions.csv with rows practice records spread over days."""
+    rng = random.Random(seed)
+    backend = storage.CSVStorage(os.path.join(workdir, 'data.csv'),
+                                 os.path.join(workdir, 'sessions.csv'),
+                                 os.path.join(workdir, 'daily_stats.csv'))
+    backend.init()
+
+    start = datetime.now() - timedelta(days=days)
+    step = timedelta(days=days) / max(rows, 1)
+    notes = music_utils.NOTES
+    practice, sessions = [], []
+    session_id, session_start, answered, correct, time_sum = None, None, 0, 0, 0
+
+    for i in range(rows):
+        ts = start + step * i
+        if session_id is None:
+            session_id, session_start = f"{rng.getrandbits(32):08x}", ts
+            answered = correct = time_sum = 0
+
+        if rng.random() < 0.9:
+            note = rng.choice(notes)
+            answer = note if rng.random() < 0.8 else rng.choice(notes)
+            response_time = rng.randint(400, 4000)
+            score = int(answer == note)
+            practice.append([ts.isoformat(), 'key_practice', score, 'beginner',
+                             rng.choice(music_utils.CLEFS), note, answer, '', '',
+                             session_id, response_time, f"Octave: {rng.randint(2, 5)}"])
+            answered += 1
+            correct += score
+            time_sum += response_time
+            if answered == 10:
+                sessions.append([session_id, session_start.isoformat(), ts.isoformat(),
+                                 'key_practice', answered, correct,
+                                 round(correct / answered * 100, 1), round(time_sum / answered),
+                                 'mixed', 'mixed'])
+                session_id = None
+        else:
+            practice.append([ts.isoformat(), 'sight_reading_generated', 1, 'beginner', 'treble',
+                             '', '', 'C', '4/4', session_id or '', 0, '32 notes, 4 measures'])
+
+        if len(practice) >= WRITE_CHUNK:
+            backend.append_practice(practice)
+            practice = []
+    if practice:
+        backend.append_practice(practice)
+    backend.append_sessions(sessions)
+    return len(sessions)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, math.ceil(pct / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize(samples, elapsed=None):
+    """Latency percentiles in ms and throughput for a list of durations in seconds."""
+    samples = sorted(samples)
+    elapsed = elapsed if elapsed is not None else sum(samples)
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3) if samples else 0.0,
+        'throughput_per_s': round(len(samples) / elapsed, 2) if elapsed else 0.0
+    }
+
+
+def time_calls(fn, repeat):
+    """Call fn repeat times and summarize the durations."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def micro_benchmarks(app, repeat):
+    """Time the hot functions one call at a time, bypassing the HTTP response cache."""
+    def view(endpoint, path):
+        handler = app.app.view_functions[endpoint]
+        handler = getattr(handler, '__wrapped__', handler)
+
+        def call():
+            with app.app.test_request_context(path):
+                handler()
+        return call
+
+    os.makedirs('exports', exist_ok=True)
+    melody = music_utils.generate_melody('advanced', 'treble')
+    targets = {
+        'parse_csv_safely': app.parse_csv_safely,
+        'get_stats': view('get_stats', '/api/stats'),
+        'get_sessions': view('get_sessions', '/api/sessions?limit=50'),
+        'get_graph_data': view('get_graph_data', '/api/graph-data?points=200'),
+        'generate_melody': lambda: music_utils.generate_melody('advanced', 'treble'),
+        'create_practice_pdf': lambda: music_utils.create_practice_pdf(melody, 'benchmark.pdf'),
+    }
+
+    results = {}
+    for name, fn in targets.items():
+        # parse_csv_safely reads the whole log, so keep its run count small
+        results[name] = time_calls(fn, max(1, repeat // 10) if name == 'parse_csv_safely' else repeat)
+        print(f"⏱️  {name}: p50 {results[name]['p50_ms']} ms, p99 {results[name]['p99_ms']} ms")
+    return results
+
+
+def load_test(request_fn, requests, concurrency, seed):
+    """Send requests from concurrency threads, returning per-endpoint and overall latency."""
+    rng = random.Random(seed)
+    weighted = [entry for entry in LOAD_MIX for _ in range(entry[3])]
+    plan = [rng.choice(weighted) for _ in range(requests)]
+    samples = {path: [] for _, path, _, _ in LOAD_MIX}
+    errors = []
+    lock = threading.Lock()
+    position = iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(position, None)
+            if i is None:
+                return
+            method, path, body, _ = plan[i]
+            started = time.perf_counter()
+            status = request_fn(method, path, body)
+            duration = time.perf_counter() - started
+            with lock:
+                samples[path].append(duration)
+                if status >= 400:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {path: summarize(durations) for path, durations in samples.items() if durations}
+    results['overall'] = summarize([d for durations in samples.values() for d in durations], elapsed)
+    results['overall']['errors'] = len(errors)
+    return results
+
+
+def test_client_requester(app):
+    """Requests through the Flask test client, one client per thread."""
+    local = threading.local()
+
+    def send(method, path, body):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.app.test_client()
+        return client.open(path, method=method, json=body).status_code
+    return send
+
+
+def http_requester(base_url):
+    """Requests against a running server, e.g. gunicorn on localhost."""
+    def send(method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(base_url.rstrip('/') + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return send
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its children, in MB."""
+    kb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss +
+          resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(kb / 1024, 1)
+
+
+def compare(results, baseline, tolerance):
+    """Print p95 and throughput regressions beyond tolerance; return how many there were."""
+    regressions = 0
+    for section in ('functions', 'load'):
+        for name, current in results.get(section, {}).items():
+            previous = baseline.get(section, {}).get(name)
+            if not previous:
+                continue
+            if previous['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                print(f"❌ {section}/{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+                regressions += 1
+            if (section == 'load' and previous['throughput_per_s'] and
+                    current['throughput_per_s'] < previous['throughput_per_s'] * (1 - tolerance)):
+                print(f"❌ {section}/{name}: throughput {previous['throughput_per_s']} -> "
+                      f"{current['throughput_per_s']} req/s")
+                regressions += 1
+    if not regressions:
+        print(f"✅ No regressions beyond {tolerance:.0%} of the baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the practice app on synthetic data")
+    parser.add_argument('--rows', type=int, default=10000,
+                        help="practice rows to synthesize (e.g. 10000 to 10000000)")
+    parser.add_argument('--days', type=int, default=365, help="days of history the rows span")
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv')
+    parser.add_argument('--repeat', type=int, default=50, help="calls per timed function")
+    parser.add_argument('--requests', type=int, default=2000, help="load test requests")
+    parser.add_argument('--concurrency', type=int, default=8, help="load test threads")
+    parser.add_argument('--url', help="load test a running server (e.g. http://127.0.0.1:8000) "
+                                      "instead of the Flask test client")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', help="directory for the synthetic data (default: a temp dir)")
+    parser.add_argument('--keep', action='store_true', help="keep the synthetic data afterwards")
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', help="JSON from an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed slowdown before a result counts as a regression")
+    args = parser.parse_args()
+
+    print("🎹 Piano Practice App - Benchmark")
+    print("=" * 50)
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='piano-bench-'))
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    started = time.perf_counter()
+    session_count = synthesize(workdir, args.rows, args.days, args.seed)
+    synth_seconds = time.perf_counter() - started
+    print(f"✅ Synthesized {args.rows} practice rows and {session_count} sessions "
+          f"in {synth_seconds:.1f}s ({workdir})")
+
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.environ['SQLITE_FILE'] = os.path.join(workdir, 'practice.db')
+    if args.backend == 'sqlite':
+        import data_migration
+        target = storage.SQLiteStorage(os.environ['SQLITE_FILE'])
+        target.init()
+        data_migration.migrate(storage.CSVStorage('data.csv', 'sessions.csv', 'daily_stats.csv'), target)
+
+    started = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - started
+    app.wait_for_storage()
+    startup_seconds = time.perf_counter() - started
+    print(f"✅ Imported app in {import_seconds:.2f}s, loaded views in {startup_seconds:.2f}s")
+
+    results = {
+        'created_at': datetime.now().isoformat(),
+        'config': {k: getattr(args, k) for k in ('rows', 'days', 'backend', 'repeat',
+                                                 'requests', 'concurrency', 'url', 'seed')},
+        'synthesize_seconds': round(synth_seconds, 3),
+        'import_seconds': round(import_seconds, 3),
+        'startup_seconds': round(startup_seconds, 3),
+    }
+
+    print("\n📊 Timing functions")
+    results['functions'] = micro_benchmarks(app, args.repeat)
+
+    print(f"\n🚀 Load test: {args.requests} requests, {args.concurrency} threads")
+    send = http_requester(args.url) if args.url else test_client_requester(app)
+    results['load'] = load_test(send, args.requests, args.concurrency, args.seed)
+    overall = results['load']['overall']
+    print(f"✅ {overall['throughput_per_s']} req/s, p50 {overall['p50_ms']} ms, "
+          f"p95 {overall['p95_ms']} ms, p99 {overall['p99_ms']} ms, {overall['errors']} errors")
+
+    app.practice_writer.close()
+    results['peak_rss_mb'] = peak_rss_mb()
+    print(f"✅ Peak RSS {results['peak_rss_mb']} MB")
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    if not args.keep and not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        print("\n" + "=" * 50)
+        sys.exit(1 if compare(results, baseline, args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Data Migration Script for Piano Practice App
+Imports data.csv, sessions.csv and daily_stats.csv into the SQLite backend,
+or rebuilds the daily stats rollup from the practice log
+"""
+
+import argparse
+import os
+
+import stats_engine
+import storage
+
+BATCH_SIZE = 5000
+
+
+def copy_in_batches(rows, write):
+    """Write rows through write() in batches, returning the number copied."""
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            write(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        write(batch)
+        total += len(batch)
+    return total
+
+
+def migrate(source, target):
+    """Copy every practice row, session summary and daily stat from source to target."""
+    practice = copy_in_batches((list(record) for record in source.iter_practice()),
+                               target.append_practice)
+    print(f"✅ Imported {practice} practice rows")
+
+    sessions = copy_in_batches(([row.get(c, '') for c in storage.SESSION_COLUMNS]
+                                for row in source.iter_sessions()),
+                               target.append_sessions)
+    print(f"✅ Imported {sessions} session summaries")
+
+    daily = copy_in_batches(source.iter_daily_stats(), target.replace_daily_stats)
+    print(f"✅ Imported {daily} daily stats rows")
+
+
+def rebuild_daily_stats(backend):
+    """Recompute every day of the daily stats rollup from the practice log in one pass."""
+    rollup = stats_engine.DailyRollup()
+    rollup.rebuild(backend.iter_practice())
+    rows = rollup.take_dirty()
+    backend.replace_daily_stats(rows, clear=True)
+    print(f"✅ Rebuilt {len(rows)} days of daily stats")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import the CSV practice data into SQLite")
+    parser.add_argument('--csv-file', default='data.csv')
+    parser.add_argument('--sessions-file', default='sessions.csv')
+    parser.add_argument('--stats-file', default='daily_stats.csv')
+    parser.add_argument('--archive-dir', default=os.environ.get('ARCHIVE_DIR', 'archive'))
+    parser.add_argument('--sqlite-file', default=os.environ.get('SQLITE_FILE', 'practice.db'))
+    parser.add_argument('--force', action='store_true',
+                        help="import even if the database already has practice rows")
+    parser.add_argument('--rebuild-daily-stats', metavar='BACKEND', choices=['csv', 'sqlite'],
+                        help="rebuild the daily stats rollup for this backend instead of importing")
+    args = parser.parse_args()
+
+    print("🎹 Piano Practice App - Data Migration")
+    print("=" * 50)
+
+    source = storage.CSVStorage(args.csv_file, args.sessions_file, args.stats_file, args.archive_dir)
+    target = storage.SQLiteStorage(args.sqlite_file)
+
+    if args.rebuild_daily_stats:
+        backend = target if args.rebuild_daily_stats == 'sqlite' else source
+        backend.init()
+        rebuild_daily_stats(backend)
+        return
+
+    target.init()
+
+    if target.practice_reader().has_new_rows() and not args.force:
+        print(f"❌ {args.sqlite_file} already contains practice data (use --force to import anyway)")
+        return
+
+    migrate(source, target)
+
+    print("\n" + "=" * 50)
+    print(f"🎉 Migration complete: set STORAGE_BACKEND=sqlite and SQLITE_FILE={args.sqlite_file}")
+
+
+if __name__ == "__main__":
+    main()
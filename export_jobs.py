@@ -0,0 +1,321 @@
+"""
+Background PDF export jobs.
+Practice sheets are rendered in a bounded process pool so ReportLab's
+CPU-bound work never holds a web worker's GIL. Job status lives in a
+state store, so any worker sharing that store can answer status polls.
+
+PDFs are rendered in memory and content addressed: the name is a hash of
+the canonical melody JSON, and recent sheets are kept in a size-bounded LRU
+so a repeat export is served without rendering. With archiving enabled each
+sheet is also written to the exports directory, which is kept under a size
+and age budget by evicting the least recently used files first.
+"""
+
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import music_utils
+
+
+class QueueFull(Exception):
+    """Raised when too many exports are already waiting or rendering."""
+
+
+FILE_PREFIX = 'practice_sheet_'
+
+
+def melody_digest(melody_data):
+    """Hash of the canonical JSON form of a melody payload."""
+    canonical = json.dumps(melody_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def render_job(melody_data, filename, archive_dir=None):
+    """Render one practice sheet in a pool process; return (started, finished, pdf bytes).
+
+    With archive_dir the PDF is also written there under a temporary name
+    and renamed into place, so an archived file is never seen half written.
+    """
+    started = time.time()
+    pdf = music_utils.render_practice_pdf(melody_data)
+    if archive_dir:
+        path = os.path.join(archive_dir, filename)
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, 'wb') as f:
+            f.write(pdf)
+        os.replace(partial, path)
+    return started, time.time(), pdf
+
+
+def render_bulk(count, difficulty, clef, fmt, seed=None):
+    """Generate count melodies and render them as one PDF or a ZIP; return the bytes."""
+    melodies = music_utils.generate_melodies(count, difficulty, clef, seed)
+    output = io.BytesIO()
+    if fmt == 'zip':
+        music_utils.create_practice_zip(melodies, output)
+    else:
+        music_utils.create_practice_workbook(melodies, output)
+    return output.getvalue()
+
+
+class ExportJobs:
+    """Submits exports to a process pool and tracks their status."""
+
+    def __init__(self, store, max_workers=2, max_pending=16, max_memory_bytes=32 * 1024 * 1024,
+                 archive=False, output_dir='exports',
+                 max_cache_bytes=200 * 1024 * 1024, max_cache_age=7 * 24 * 3600):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_memory_bytes = max_memory_bytes
+        self.archive = archive
+        self.output_dir = output_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.max_cache_age = max_cache_age
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.rendering = {}  # filename -> future of the render in flight
+        self.sheets = OrderedDict()  # filename -> pdf bytes, least recently used first
+        self.memory_bytes = 0
+        self._pool = None
+        self._pid = None
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self.evicted = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.render_total = 0.0
+        self.render_max = 0.0
+
+    def _executor(self):
+        # Pools don't survive fork(), so each worker process starts its own on first use.
+        # Render processes start from a fork server (or are spawned), not from a copy of a
+        # threaded web worker; they only need this module, which imports ReportLab lazily.
+        if self._pool is None or self._pid != os.getpid():
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            if context.get_start_method() == 'forkserver':
+                context.set_forkserver_preload([__name__])
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            self._pid = os.getpid()
+        return self._pool
+
+    def submit(self, melody_data, on_done=None):
+        """Queue a render and return (job, future); raises QueueFull when saturated.
+
+        The future's result is (started, finished, pdf bytes). A melody that
+        was exported before is served from the cache and its job is already
+        done; one that is rendering now shares that render. on_done(job) is
+        called after a successful export, from a pool thread unless the PDF
+        was cached.
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'status': 'queued',
+            'filename': f"{FILE_PREFIX}{melody_digest(melody_data)[:32]}.pdf",
+            'submitted_at': time.time(),
+            'queue_wait_ms': None,
+            'render_ms': None,
+            'cached': False,
+            'error': None
+        }
+
+        pdf = self.read(job)
+        if pdf is not None:
+            with self.lock:
+                self.submitted += 1
+                self.cache_hits += 1
+            job.update(status='done', queue_wait_ms=0, render_ms=0, cached=True)
+            self.store.set(job_id, job)
+            future = Future()
+            future.set_result((job['submitted_at'], job['submitted_at'], pdf))
+            if on_done:
+                on_done(job)
+            return job, future
+
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{self.pending} exports already queued")
+            self.pending += 1
+            self.submitted += 1
+            future = self.rendering.get(job['filename'])
+
+        self.store.set(job_id, job)
+
+        if future is None:
+            archive_dir = None
+            if self.archive:
+                os.makedirs(self.output_dir, exist_ok=True)
+                archive_dir = self.output_dir
+            try:
+                future = self._executor().submit(render_job, melody_data, job['filename'], archive_dir)
+            except Exception:
+                with self.lock:
+                    self.pending -= 1
+                raise
+            with self.lock:
+                self.rendering[job['filename']] = future
+        future.add_done_callback(lambda f: self._finish(job, f, on_done))
+        return job, future
+
+    def run(self, fn, *args):
+        """Run fn(*args) in the pool under the same queue limit; return its future."""
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{self.pending} exports already queued")
+            self.pending += 1
+            self.submitted += 1
+
+        try:
+            future = self._executor().submit(fn, *args)
+        except Exception:
+            with self.lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self.lock:
+            self.pending -= 1
+            if future.exception() is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def read(self, job):
+        """Return the PDF bytes of a job from memory or the archive, or None if gone."""
+        filename = job['filename']
+        with self.lock:
+            pdf = self.sheets.get(filename)
+            if pdf is not None:
+                self.sheets.move_to_end(filename)
+                return pdf
+
+        if not self.archive:
+            return None
+        try:
+            path = self.path(job)
+            os.utime(path)  # mark as recently used
+            with open(path, 'rb') as f:
+                pdf = f.read()
+        except OSError:
+            return None
+        self._remember(filename, pdf)
+        return pdf
+
+    def _remember(self, filename, pdf):
+        """Keep a rendered PDF in the in-memory LRU."""
+        with self.lock:
+            if filename in self.sheets:
+                self.memory_bytes -= len(self.sheets.pop(filename))
+            self.sheets[filename] = pdf
+            self.memory_bytes += len(pdf)
+            while self.memory_bytes > self.max_memory_bytes and self.sheets:
+                _, dropped = self.sheets.popitem(last=False)
+                self.memory_bytes -= len(dropped)
+
+    def _finish(self, job, future, on_done):
+        with self.lock:
+            self.pending -= 1
+            if self.rendering.get(job['filename']) is future:
+                del self.rendering[job['filename']]
+
+        try:
+            started, finished, pdf = future.result()
+        except Exception as e:
+            job.update(status='failed', error=str(e))
+            with self.lock:
+                self.failed += 1
+            self.store.set(job['job_id'], job)
+            return
+
+        queue_wait = max(started - job['submitted_at'], 0.0)
+        render = finished - started
+        self._remember(job['filename'], pdf)
+        job.update(status='done', queue_wait_ms=round(queue_wait * 1000), render_ms=round(render * 1000))
+        with self.lock:
+            self.completed += 1
+            self.queue_wait_total += queue_wait
+            self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+            self.render_total += render
+            self.render_max = max(self.render_max, render)
+        self.store.set(job['job_id'], job)
+        if self.archive:
+            self.evict()
+
+        if on_done:
+            on_done(job)
+
+    def status(self, job_id):
+        """Return the job dict, or None if unknown or expired."""
+        return self.store.get(job_id)
+
+    def path(self, job):
+        """Path of a job's archived PDF."""
+        return os.path.join(self.output_dir, job['filename'])
+
+    def evict(self):
+        """Delete archived PDFs older than max_cache_age, then the least recently
+        used ones until the directory fits in max_cache_bytes."""
+        now = time.time()
+        files = []
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(FILE_PREFIX) and entry.name.endswith('.pdf'):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, entry.path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            if total <= self.max_cache_bytes and now - mtime <= self.max_cache_age:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        with self.lock:
+            self.evicted += removed
+        return removed
+
+    def metrics(self):
+        """Queue depth, outcome and cache counts and queue wait / render time totals."""
+        return {
+            'pending': self.pending,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'cache_hits': self.cache_hits,
+            'memory_sheets': len(self.sheets),
+            'memory_bytes': self.memory_bytes,
+            'evicted': self.evicted,
+            'queue_wait_seconds_total': round(self.queue_wait_total, 6),
+            'queue_wait_seconds_max': round(self.queue_wait_max, 6),
+            'render_seconds_total': round(self.render_total, 6),
+            'render_seconds_max': round(self.render_max, 6)
+        }
@@ -0,0 +1,55 @@
+"""
+Gunicorn configuration for production.
+The app is imported once in the master (preload_app), and the master waits
+for storage setup and the in-memory views to finish loading before forking,
+so every worker shares them copy-on-write.
+Worker threads, the log writer thread, the PDF export pool and SQLite
+connections are all started lazily in each worker after the fork.
+
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import multiprocessing
+import os
+
+cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+preload_app = True
+
+# Threaded workers: requests mostly wait on file or SQLite I/O and the export
+# pool, so a few processes with several threads each beat many sync workers
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(cpus + 1, 4)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+# Per-client state has to be visible to every worker once there is more than
+# one, so default to the shared SQLite stores and archived PDFs
+if workers > 1:
+    os.environ.setdefault('STATE_BACKEND', 'sqlite')
+    os.environ.setdefault('EXPORT_ARCHIVE', '1')
+    # The export pool and its queue limit are per worker, so split the defaults
+    # between workers rather than starting a pool of two renderers in each
+    os.environ.setdefault('EXPORT_WORKERS', '1')
+    os.environ.setdefault('EXPORT_QUEUE_SIZE', str(max(16 // workers, 2)))
+
+
+def when_ready(server):
+    """Finish loading the practice views in the master before any worker forks."""
+    from app import wait_for_storage
+    wait_for_storage()
+
+
+def worker_exit(server, worker):
+    """Write out any practice rows still queued in this worker."""
+    from app import practice_writer, shard_writer
+    practice_writer.close()
+    if shard_writer:
+        shard_writer.close()
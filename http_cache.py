@@ -0,0 +1,110 @@
+"""
+Response cache with strong ETags for read-only JSON endpoints.
+Responses are keyed on the request path, query string, a data version and
+optional per-client values, so a repeated request answers 304 Not Modified
+or reuses the cached (and compressed) body until new data is written.
+"""
+
+import functools
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSORS = {'gzip': lambda body: gzip.compress(body, compresslevel=6)}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda body: brotli.compress(body, quality=5)
+
+
+class ResponseCache:
+    """LRU cache of successful JSON response bodies, one entry per ETag."""
+
+    def __init__(self, version, maxsize=256, min_compress_size=1024):
+        self.version = version
+        self.maxsize = maxsize
+        self.min_compress_size = min_compress_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # tag -> {encoding or None: body bytes}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def cached(self, vary=None):
+        """Decorate a view so its 200 responses are cached and served with ETags.
+
+        vary is an optional callable returning per-client values that are
+        part of the response body (e.g. the current session's progress).
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                parts = (request.path, request.query_string, self.version(),
+                         vary() if vary else None)
+                tag = hashlib.sha1(repr(parts).encode()).hexdigest()[:24]
+
+                # Any representation of this tag is still current for the client
+                for etag in [tag] + [f"{tag}-{name}" for name in COMPRESSORS]:
+                    if request.if_none_match.contains(etag):
+                        self.not_modified += 1
+                        return self._finish(Response(status=304), etag, vary)
+
+                with self.lock:
+                    entry = self.entries.get(tag)
+                    if entry is not None:
+                        self.entries.move_to_end(tag)
+
+                if entry is None:
+                    self.misses += 1
+                    response = view(*args, **kwargs)
+                    if not isinstance(response, Response) or response.status_code != 200:
+                        return response
+                    entry = {None: response.get_data()}
+                    with self.lock:
+                        self.entries[tag] = entry
+                        if len(self.entries) > self.maxsize:
+                            self.entries.popitem(last=False)
+                else:
+                    self.hits += 1
+
+                encoding = self._choose_encoding(len(entry[None]))
+                if encoding and encoding not in entry:
+                    entry[encoding] = COMPRESSORS[encoding](entry[None])
+
+                response = Response(entry[encoding], mimetype='application/json')
+                if encoding:
+                    response.headers['Content-Encoding'] = encoding
+                return self._finish(response, f"{tag}-{encoding}" if encoding else tag, vary)
+            return wrapper
+        return decorator
+
+    def _choose_encoding(self, size):
+        if size < self.min_compress_size:
+            return None
+        for name in ('br', 'gzip'):
+            if name in COMPRESSORS and request.accept_encodings[name]:
+                return name
+        return None
+
+    def _finish(self, response, etag, vary):
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        if vary:
+            response.vary.add('Cookie')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def metrics(self):
+        """Hit, miss and 304 counters."""
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified
+        }
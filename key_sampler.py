@@ -0,0 +1,137 @@
+"""
+Weakness-weighted question sampling for key practice.
+Every (note, accidental, clef, octave) question keeps its answer, error and
+response time totals, and a weight derived from them lives in a Fenwick
+tree. Folding in an answer and drawing a question are both O(log n), so
+the history is read once at startup (as a practice view) and never again.
+"""
+
+import random
+import re
+import threading
+
+import music_utils
+from stats_engine import _is_correct, _response_time
+
+# An unanswered question counts as half missed; this floor keeps mastered
+# questions coming back now and then
+MIN_WEIGHT = 0.05
+
+# Answers slower than this make a question more likely, up to MAX_SLOWNESS times
+TARGET_RESPONSE_MS = 3000
+MAX_SLOWNESS = 2.0
+
+OCTAVE_NOTE = re.compile(r'Octave:\s*(\d+)')
+
+
+class FenwickTree:
+    """Binary indexed tree of non-negative weights with O(log n) update and sampling."""
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0.0] * (size + 1)
+        self.top = 1 << (size.bit_length() - 1) if size else 0
+
+    def add(self, index, delta):
+        """Add delta to the weight at index."""
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        """Sum of every weight."""
+        total = 0.0
+        i = self.size
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, target):
+        """Index of the weight covering target, for 0 <= target < total()."""
+        position = 0
+        step = self.top
+        while step:
+            following = position + step
+            if following <= self.size and self.tree[following] <= target:
+                position = following
+                target -= self.tree[following]
+            step >>= 1
+        return min(position, self.size - 1)
+
+
+class KeyWeights:
+    """Per-question key practice history and a weighted sampler over it.
+
+    A question's weight is its probability under the uniform generator times
+    MIN_WEIGHT plus its smoothed error rate scaled by how slow its answers
+    are, so with no history draws match generate_random_key().
+    """
+
+    def __init__(self, rng=None):
+        self.lock = threading.Lock()
+        # The module-level generator is reseeded after fork(), so preloaded workers draw differently
+        self.rng = rng or random
+        items = music_utils.key_items()
+        self.items = [item for item, _ in items]
+        self.priors = [probability for _, probability in items]
+        self.index = {item: i for i, item in enumerate(self.items)}
+        self.answers = [0] * len(self.items)
+        self.errors = [0] * len(self.items)
+        self.time_sum = [0.0] * len(self.items)
+        self.time_count = [0] * len(self.items)
+        self.weights = [self.weight(i) for i in range(len(self.items))]
+        self.tree = FenwickTree(len(self.items))
+        for i, weight in enumerate(self.weights):
+            self.tree.add(i, weight)
+
+    def weight(self, i):
+        """Sampling weight of question i from its totals."""
+        error_rate = (self.errors[i] + 1) / (self.answers[i] + 2)
+        slowness = 1.0
+        if self.time_count[i]:
+            average = self.time_sum[i] / self.time_count[i]
+            slowness = min(max(average / TARGET_RESPONSE_MS, 1.0), MAX_SLOWNESS)
+        return self.priors[i] * (MIN_WEIGHT + error_rate * slowness)
+
+    def lookup(self, clef, correct_answer, notes):
+        """Index of the question a logged row asked, or None if it can't be told."""
+        match = OCTAVE_NOTE.search(notes or '')
+        if not match or not correct_answer:
+            return None  # legacy rows have no clef or octave
+        item = (correct_answer[0], correct_answer[1:], clef, int(match.group(1)))
+        return self.index.get(item)
+
+    def add(self, record):
+        """Fold one PracticeRecord into the weights."""
+        if record.type != 'key_practice':
+            return
+        i = self.lookup(record.clef, record.correct_answer, record.notes)
+        if i is None:
+            return
+        response_time = _response_time(record.response_time_ms)
+        self._update(i, 1, 0 if _is_correct(record.score) else 1,
+                     response_time or 0.0, response_time is not None)
+
+    def add_aggregate(self, clef, correct_answer, notes, answers, correct, time_sum, time_count):
+        """Fold pre-aggregated key practice counts for one logged question."""
+        i = self.lookup(clef, correct_answer, notes)
+        if i is not None:
+            self._update(i, answers, answers - correct, time_sum, time_count)
+
+    def _update(self, i, answers, errors, time_sum, time_count):
+        with self.lock:
+            self.answers[i] += answers
+            self.errors[i] += errors
+            self.time_sum[i] += time_sum
+            self.time_count[i] += time_count
+            weight = self.weight(i)
+            self.tree.add(i, weight - self.weights[i])
+            self.weights[i] = weight
+
+    def sample(self):
+        """Draw a (note, accidental, clef, octave) question by weight."""
+        with self.lock:
+            return self.items[self.tree.find(self.rng.random() * self.tree.total())]
+
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Log Rotation for Piano Practice App
+Moves closed rows of data.csv into a columnar archive so the live CSV stays small.
+
+Each archive segment is a directory of flat column files: text columns are
+dictionary encoded (the narrowest unsigned codes that fit, plus the distinct
+values in meta.json),
+timestamps are offsets into one UTF-8 blob, and score / response time are
+also kept as float64 arrays (NaN when missing) for aggregates. Column files
+are memory-mapped on read, so stats can be seeded from the arrays without
+parsing any CSV.
+
+Rotation rewrites data.csv, so run it while the app is stopped (e.g. as a
+deploy step before starting the server).
+"""
+
+import argparse
+import json
+import math
+import mmap
+import os
+import sys
+from array import array
+from datetime import datetime, timedelta
+from itertools import chain
+
+import practice_log
+from optional_deps import optional_numpy
+from practice_log import PRACTICE_COLUMNS, PracticeRecord
+from stats_engine import _response_time
+
+FORMAT_VERSION = 1
+SEGMENT_PREFIX = 'segment-'
+
+# Timestamps are nearly all distinct, so they are stored as a string blob;
+# every other column is dictionary encoded
+DICT_COLUMNS = tuple(column for column in PRACTICE_COLUMNS if column != 'timestamp')
+
+
+def _to_score(value):
+    """Score as a float, NaN if it isn't a number."""
+    try:
+        return float(value) if value else math.nan
+    except ValueError:
+        return math.nan
+
+
+def _to_response_time(value):
+    """Response time as a float, NaN if missing."""
+    response_time = _response_time(value)
+    return math.nan if response_time is None else response_time
+
+
+def code_typecode(size):
+    """Narrowest array typecode that can hold codes for size distinct values."""
+    if size <= 1 << 8:
+        return 'B'
+    if size <= 1 << 16:
+        return 'H'
+    return 'I'
+
+
+def write_segment(records, archive_dir):
+    """Write records as the next columnar segment; return its path, or None if there were none."""
+    dictionaries = {column: {} for column in DICT_COLUMNS}
+    codes = {column: array('I') for column in DICT_COLUMNS}
+    offsets = array('Q', [0])
+    text = bytearray()
+    scores = array('d')
+    times = array('d')
+
+    for record in records:
+        for column in DICT_COLUMNS:
+            value = getattr(record, column)
+            mapping = dictionaries[column]
+            code = mapping.get(value)
+            if code is None:
+                code = mapping[value] = len(mapping)
+            codes[column].append(code)
+        text += record.timestamp.encode('utf-8')
+        offsets.append(len(text))
+        scores.append(_to_score(record.score))
+        times.append(_to_response_time(record.response_time_ms))
+
+    rows = len(offsets) - 1
+    if not rows:
+        return None
+
+    os.makedirs(archive_dir, exist_ok=True)
+    existing = [name for name in os.listdir(archive_dir) if name.startswith(SEGMENT_PREFIX)]
+    path = os.path.join(archive_dir, f"{SEGMENT_PREFIX}{len(existing) + 1:05d}")
+    partial = os.path.join(archive_dir, f".{os.path.basename(path)}.tmp")
+    os.makedirs(partial)
+
+    typecodes = {column: code_typecode(len(dictionaries[column])) for column in DICT_COLUMNS}
+    files = {f"{column}.codes": array(typecodes[column], codes[column]) for column in DICT_COLUMNS}
+    files.update({'timestamp.offsets': offsets, 'score.f64': scores, 'response_time_ms.f64': times})
+    for filename, values in files.items():
+        with open(os.path.join(partial, filename), 'wb') as f:
+            values.tofile(f)
+    with open(os.path.join(partial, 'timestamp.data'), 'wb') as f:
+        f.write(text)
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'rows': rows,
+        'byteorder': sys.byteorder,
+        'first_timestamp': text[:offsets[1]].decode('utf-8'),
+        'last_timestamp': text[offsets[-2]:].decode('utf-8'),
+        'dictionaries': {column: list(dictionaries[column]) for column in DICT_COLUMNS},
+        'typecodes': typecodes
+    }
+    with open(os.path.join(partial, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    os.rename(partial, path)
+    return path
+
+
+class Segment:
+    """Read-only view of one archive segment; column files are memory-mapped on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != FORMAT_VERSION or meta['byteorder'] != sys.byteorder:
+            raise ValueError(f"Unsupported archive segment: {path}")
+        self.rows = meta['rows']
+        self.first_timestamp = meta['first_timestamp']
+        self.last_timestamp = meta['last_timestamp']
+        self.dictionaries = meta['dictionaries']
+        self.typecodes = meta['typecodes']
+        self._columns = {}
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, filename, typecode):
+        """Memory-mapped column file as a typed memoryview."""
+        view = self._columns.get(filename)
+        if view is None:
+            with open(os.path.join(self.path, filename), 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast(typecode)
+                else:
+                    view = memoryview(b'').cast(typecode)
+            self._columns[filename] = view
+        return view
+
+    def codes(self, column):
+        return self.column(f"{column}.codes", self.typecodes[column])
+
+    def numeric(self, column):
+        return self.column(f"{column}.f64", 'd')
+
+    def timestamp(self, i):
+        offsets = self.column('timestamp.offsets', 'Q')
+        return str(self.column('timestamp.data', 'B')[offsets[i]:offsets[i + 1]], 'utf-8')
+
+    def record(self, i):
+        """The PracticeRecord at row i."""
+        return PracticeRecord(self.timestamp(i), *[self.dictionaries[column][self.codes(column)[i]]
+                                                   for column in DICT_COLUMNS])
+
+    def iter_records(self):
+        """Yield every row as a PracticeRecord, sharing the dictionary strings."""
+        values = [self.dictionaries[column] for column in DICT_COLUMNS]
+        offsets = self.column('timestamp.offsets', 'Q')
+        data = self.column('timestamp.data', 'B')
+        for i, row in enumerate(zip(*[self.codes(column) for column in DICT_COLUMNS])):
+            yield PracticeRecord(str(data[offsets[i]:offsets[i + 1]], 'utf-8'),
+                                 *[column_values[code] for column_values, code in zip(values, row)])
+
+    def aggregates(self):
+        """Rows, correct answers, response time sum and count per (type, clef) code pair."""
+        types, clefs = self.codes('type'), self.codes('clef')
+        scores, times = self.numeric('score'), self.numeric('response_time_ms')
+
+        np = optional_numpy()  # optional, vectorizes the aggregates
+        if np:
+            width = max(len(self.dictionaries['clef']), 1)
+            keys = np.asarray(types, dtype=np.int64) * width + np.asarray(clefs)
+            times = np.frombuffer(times, dtype=np.float64)
+            timed = ~np.isnan(times)
+            size = len(self.dictionaries['type']) * width
+            columns = [np.bincount(keys, minlength=size),
+                       np.bincount(keys, weights=np.frombuffer(scores, dtype=np.float64) == 1, minlength=size),
+                       np.bincount(keys, weights=np.where(timed, times, 0.0), minlength=size),
+                       np.bincount(keys, weights=timed, minlength=size)]
+            return {divmod(int(key), width): (int(columns[0][key]), int(columns[1][key]),
+                                              float(columns[2][key]), int(columns[3][key]))
+                    for key in np.flatnonzero(columns[0])}
+
+        groups = {}
+        for key, score, response_time in zip(zip(types, clefs), scores, times):
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [0, 0, 0.0, 0]
+            group[0] += 1
+            group[1] += score == 1
+            if response_time == response_time:  # not NaN
+                group[2] += response_time
+                group[3] += 1
+        return {key: tuple(group) for key, group in groups.items()}
+
+
+class Archive:
+    """Every segment in an archive directory, oldest first."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        names = sorted(name for name in os.listdir(directory)
+                       if name.startswith(SEGMENT_PREFIX)) if os.path.isdir(directory) else []
+        self.segments = [Segment(os.path.join(directory, name)) for name in names]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def iter_records(self):
+        """Stream every archived record in log order."""
+        return chain.from_iterable(segment.iter_records() for segment in self.segments)
+
+    def seed_stats(self, stats):
+        """Seed PracticeStats from the column arrays plus the last archived rows."""
+        for segment in self.segments:
+            type_values, clef_values = segment.dictionaries['type'], segment.dictionaries['clef']
+            for (type_code, clef_code), (rows, correct, time_sum, time_count) in segment.aggregates().items():
+                stats.add_aggregate(type_values[type_code], clef_values[clef_code],
+                                    rows, correct, time_sum, time_count)
+
+        recent = []
+        for segment in reversed(self.segments):
+            types = segment.codes('type')
+            for i in range(len(segment) - 1, -1, -1):
+                if len(recent) == stats.recent.maxlen:
+                    break
+                if segment.dictionaries['type'][types[i]] != 'session_start':
+                    recent.append(segment.record(i))
+        stats.recent.extend(reversed(recent))
+
+    def seed_sessions(self, sessions):
+        """Seed SessionIndex with key practice grouped by session, in first-seen order."""
+        for segment in self.segments:
+            if 'key_practice' not in segment.dictionaries['type']:
+                continue
+            key_practice = segment.dictionaries['type'].index('key_practice')
+            groups = {}  # session code -> [questions, correct, time sum, time count, first row, last row]
+            for i, (type_code, session_code, score, response_time) in enumerate(zip(
+                    segment.codes('type'), segment.codes('session_id'),
+                    segment.numeric('score'), segment.numeric('response_time_ms'))):
+                if type_code != key_practice:
+                    continue
+                group = groups.get(session_code)
+                if group is None:
+                    group = groups[session_code] = [0, 0, 0.0, 0, i, i]
+                group[0] += 1
+                group[1] += score == 1
+                if response_time == response_time:  # not NaN
+                    group[2] += response_time
+                    group[3] += 1
+                group[5] = i
+
+            session_values = segment.dictionaries['session_id']
+            for session_code, (questions, correct, time_sum, time_count, first, last) in groups.items():
+                sessions.add_aggregate(session_values[session_code], questions, correct, time_sum,
+                                       time_count, segment.timestamp(first), segment.timestamp(last))
+
+    def seed_keys(self, keys):
+        """Seed key_sampler.KeyWeights with key practice grouped by clef, answer and notes."""
+        for segment in self.segments:
+            if 'key_practice' not in segment.dictionaries['type']:
+                continue
+            key_practice = segment.dictionaries['type'].index('key_practice')
+            groups = {}  # (clef, answer, notes) codes -> [answers, correct, time sum, time count]
+            for type_code, *key, score, response_time in zip(
+                    segment.codes('type'), segment.codes('clef'), segment.codes('correct_answer'),
+                    segment.codes('notes'), segment.numeric('score'), segment.numeric('response_time_ms')):
+                if type_code != key_practice:
+                    continue
+                group = groups.get(tuple(key))
+                if group is None:
+                    group = groups[tuple(key)] = [0, 0, 0.0, 0]
+                group[0] += 1
+                group[1] += score == 1
+                if response_time == response_time:  # not NaN
+                    group[2] += response_time
+                    group[3] += 1
+
+            values = [segment.dictionaries[column] for column in ('clef', 'correct_answer', 'notes')]
+            for codes, group in groups.items():
+                keys.add_aggregate(*(column[code] for column, code in zip(values, codes)), *group)
+
+
+def rotate(csv_file, archive_dir, keep_days=7, max_bytes=0, now=None):
+    """Archive the rows of csv_file older than keep_days and rewrite it with the rest.
+
+    Nothing happens unless the file is larger than max_bytes. Rows are cut at
+    the first one inside the kept window, so log order is preserved. Returns
+    the number of rows archived.
+    """
+    if not os.path.exists(csv_file) or (max_bytes and os.path.getsize(csv_file) <= max_bytes):
+        return 0
+
+    cutoff = ((now or datetime.now()) - timedelta(days=keep_days)).isoformat()
+    reader = practice_log.PracticeLogReader(csv_file)
+    cut = {'offset': 0, 'rows': 0}
+
+    def closed_rows():
+        for record in reader.read():
+            if record.timestamp >= cutoff:
+                return
+            yield record
+            cut['offset'] = reader.offset
+            cut['rows'] += 1
+
+    if not write_segment(closed_rows(), archive_dir):
+        return 0
+
+    # Keep the header, then everything after the archived rows
+    partial = f"{csv_file}.rotate.tmp"
+    with open(csv_file, 'rb') as source, open(partial, 'wb') as target:
+        target.write((','.join(PRACTICE_COLUMNS) + '\n').encode('utf-8'))
+        source.seek(cut['offset'])
+        while True:
+            chunk = source.read(1 << 20)
+            if not chunk:
+                break
+            target.write(chunk)
+    os.replace(partial, csv_file)
+    return cut['rows']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rotate data.csv into the columnar archive")
+    parser.add_argument('command', choices=['rotate', 'info'])
+    parser.add_argument('--csv-file', default='data.csv')
+    parser.add_argument('--archive-dir', default=os.environ.get('ARCHIVE_DIR', 'archive'))
+    parser.add_argument('--keep-days', type=int, default=7,
+                        help="rows from the last N days stay in the live CSV")
+    parser.add_argument('--max-mb', type=float, default=0,
+                        help="only rotate when the live CSV is larger than this")
+    args = parser.parse_args()
+
+    print("🎹 Piano Practice App - Log Archive")
+    print("=" * 50)
+
+    if args.command == 'rotate':
+        rows = rotate(args.csv_file, args.archive_dir, args.keep_days, int(args.max_mb * 1024 * 1024))
+        if rows:
+            print(f"✅ Archived {rows} rows older than {args.keep_days} days into {args.archive_dir}/")
+        else:
+            print("✅ Nothing to rotate")
+
+    archive = Archive(args.archive_dir)
+    for segment in archive.segments:
+        print(f"📦 {os.path.basename(segment.path)}: {len(segment)} rows, "
+              f"{segment.first_timestamp} to {segment.last_timestamp}")
+    live = os.path.getsize(args.csv_file) if os.path.exists(args.csv_file) else 0
+    print(f"📊 {len(archive)} archived rows in {len(archive.segments)} segments, "
+          f"live CSV {live / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Write-behind buffer for practice rows.
+In batched mode rows are queued in memory and a background thread writes
+them to storage in one call per max_rows rows or max_delay_ms milliseconds;
+in sync mode every row is written before append() returns.
+"""
+
+import atexit
+import logging
+import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ('sync', 'batched')
+
+
+class PracticeLogWriter:
+    """Buffers practice rows and flushes them to storage in batches."""
+
+    def __init__(self, write_rows, mode='batched', max_rows=100, max_delay_ms=250, on_flush=None):
+        if mode not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {mode}")
+        self.write_rows = write_rows
+        self.mode = mode
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.on_flush = on_flush
+
+        self.queue = []
+        self.cond = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.closed = False
+        self._thread = None
+        self._pid = None
+
+        # Counters
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+        self.last_flush_seconds = 0.0
+
+    def append(self, row):
+        """Queue one row, or write it straight away in sync mode."""
+        self.extend([row])
+
+    def extend(self, rows):
+        """Queue several rows together, or write them in one call in sync mode."""
+        if not rows:
+            return
+        if self.mode == 'sync' or self.closed:
+            with self.flush_lock:
+                written = self._write(list(rows))
+            self._flushed(written)
+            return
+
+        with self.cond:
+            self._ensure_thread()
+            self.queue.extend(rows)
+            if len(self.queue) >= self.max_rows:
+                self.cond.notify()
+
+    def flush(self):
+        """Write every queued row now.
+
+        Taking the queue and writing it happen under one lock, so batches
+        reach storage in the order they were queued and a flush returns only
+        after every row queued before it has been written.
+        """
+        with self.flush_lock:
+            with self.cond:
+                rows, self.queue = self.queue, []
+            written = self._write(rows) if rows else False
+        self._flushed(written)
+
+    def close(self):
+        """Flush remaining rows and stop accepting batched writes."""
+        self.closed = True
+        with self.cond:
+            self.cond.notify()
+        self.flush()
+
+    def metrics(self):
+        """Queue depth and flush latency counters."""
+        return {
+            'mode': self.mode,
+            'queue_depth': len(self.queue),
+            'rows_written': self.rows_written,
+            'flushes': self.flushes,
+            'flush_errors': self.flush_errors,
+            'flush_seconds_total': round(self.flush_seconds_total, 6),
+            'flush_seconds_max': round(self.flush_seconds_max, 6),
+            'last_flush_seconds': round(self.last_flush_seconds, 6)
+        }
+
+    def _write(self, rows):
+        """Write rows with flush_lock held; return True once they are stored."""
+        start = time.perf_counter()
+        try:
+            self.write_rows(rows)
+        except Exception:
+            self.flush_errors += 1
+            logger.exception("Failed to write %d practice rows, requeueing", len(rows))
+            if self.mode == 'sync' or self.closed:
+                raise
+            with self.cond:
+                self.queue[:0] = rows
+            return False
+
+        elapsed = time.perf_counter() - start
+        self.rows_written += len(rows)
+        self.flushes += 1
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+        self.last_flush_seconds = elapsed
+        return True
+
+    def _flushed(self, written):
+        # on_flush runs after flush_lock is released, so syncing views never blocks writers
+        if written and self.on_flush:
+            self.on_flush()
+
+    def _ensure_thread(self):
+        # Threads don't survive fork(), so a preloaded app starts its
+        # flusher lazily in each worker process
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='practice-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self.closed:
+            with self.cond:
+                if len(self.queue) < self.max_rows:
+                    self.cond.wait(self.max_delay)
+            self.flush()
+
+
+def install_shutdown_hooks(writer):
+    """Flush the writer at interpreter exit and on SIGTERM."""
+    atexit.register(writer.close)
+
+    try:
+        previous = signal.getsignal(signal.SIGTERM)
+    except ValueError:
+        return
+
+    def handle_sigterm(signum, frame):
+        writer.close()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    try:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except ValueError:
+        # Not the main thread; atexit still covers normal shutdown
+        pass
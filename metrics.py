@@ -0,0 +1,171 @@
+"""
+Request timing, hot-path histograms and a slow-request profiler.
+Metrics are kept per process and rendered in the Prometheus text format;
+components that already count things (the log writer, response cache,
+export pool) are exported through collectors that read their metrics()
+dicts at scrape time.
+"""
+
+import cProfile
+import functools
+import heapq
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values, extra=()):
+    """Render a Prometheus label set such as {method="GET",le="0.5"}."""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds, one series per label set."""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def timer(self, **labels):
+        """Observe the duration of a with block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def wrap(self, fn, **labels):
+        """Return fn with every call observed under labels."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.timer(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted((key, list(values)) for key, values in self.series.items())
+        for key, values in series:
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {values[-2]}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {values[-1]}")
+        return lines
+
+
+class Registry:
+    """Histograms plus collectors, rendered together for /metrics."""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.histograms = []
+        self.collectors = []  # (name, help, fn returning a dict of numbers)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(f"{self.prefix}_{name}", help, labelnames, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def collector(self, name, help, fn):
+        """Export the numeric values of fn() as gauges named <prefix>_<name>_<key>."""
+        self.collectors.append((f"{self.prefix}_{name}", help, fn))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for name, help, fn in self.collectors:
+            for key, value in fn().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# HELP {name}_{key} {help}")
+                lines.append(f"# TYPE {name}_{key} gauge")
+                lines.append(f"{name}_{key} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler:
+    """Profiles a sample of requests with cProfile and keeps pstats dumps of the slowest.
+
+    Only the `keep` slowest profiled requests have a .prof file in `directory`;
+    a slower request pushes out the fastest kept one.
+    """
+
+    def __init__(self, keep=0, sample_rate=1.0, directory='profiles'):
+        self.keep = keep
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.slowest = []  # min-heap of (seconds, path)
+
+    @property
+    def enabled(self):
+        return self.keep > 0
+
+    def start(self):
+        """Return a running profiler for this request, or None if not sampled."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Newer Pythons allow one active profiler per process; skip this request
+            return None
+        return profiler
+
+    def finish(self, profiler, seconds, label):
+        """Stop profiler and keep its stats if the request is among the slowest."""
+        profiler.disable()
+        with self.lock:
+            if len(self.slowest) >= self.keep and seconds <= self.slowest[0][0]:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            safe_label = ''.join(c if c.isalnum() else '_' for c in label).strip('_')
+            path = os.path.join(self.directory,
+                                f"{round(seconds * 1000)}ms_{safe_label}_{time.time_ns()}.prof")
+            profiler.dump_stats(path)
+            heapq.heappush(self.slowest, (seconds, path))
+            if len(self.slowest) > self.keep:
+                _, dropped = heapq.heappop(self.slowest)
+                try:
+                    os.remove(dropped)
+                except OSError:
+                    pass
+
+    def profiles(self):
+        """Kept profiles, slowest first."""
+        with self.lock:
+            return [{'seconds': round(seconds, 6), 'path': path}
+                    for seconds, path in sorted(self.slowest, reverse=True)]
@@ -1,7 +1,17 @@
+import io
 import random
 import uuid
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+import zipfile
+
+from optional_deps import optional_numpy  # speeds up generate_melodies()
+
+# ReportLab is imported on first use, so importing this module (and the app)
+# doesn't pay for it until a PDF is requested
+def reportlab_canvas():
+    """Import ReportLab on first use; return (canvas module, letter page size)."""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    return canvas, letter
 
 # Musical constants
 NOTES = ['C', 'D', 'E', 'F', 'G', 'A', 'B']
@@ -37,25 +47,74 @@ DIFFICULTY_SETTINGS = {
     },
     'advanced': {
         'time_signatures': ['4/4', '3/4', '2/4', '6/8', '5/4', '7/8'],
-        'key_signatures': list(MAJOR_KEYS.keys()) + list(MINOR_KEYS.keys()),
+        'key_signatures': list(MAJOR_KEYS.keys()) + [f"{key}m" for key in MINOR_KEYS],
         'note_range': ['C3', 'C6'],
         'rhythms': ['sixteenth', 'eighth', 'quarter', 'half', 'triplet', 'syncopated'],
         'measures': 16
     }
 }
 
-def generate_random_key():
-    """Generate a random key with clef for key recognition practice."""
-    note = random.choice(NOTES)
-    accidental = random.choice(['', '#', 'b']) if note in ['C', 'D', 'F', 'G', 'A'] else ''
-    clef = random.choice(CLEFS)
+# Scale tables, built once at import
+NATURAL_PITCHES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+ACCIDENTAL_SHIFT = {'': 0, '#': 1, 'b': -1}
+SHIFT_ACCIDENTAL = {0: '', 1: '#', 2: '##', -1: 'b', -2: 'bb'}
+MAJOR_STEPS = [0, 2, 4, 5, 7, 9, 11]
+MINOR_STEPS = [0, 2, 3, 5, 7, 8, 10]  # natural minor
+
+# Beats drawn per measure for each time signature
+NOTES_PER_MEASURE = {'4/4': 4, '3/4': 3, '2/4': 2, '6/8': 6, '5/4': 5, '7/8': 7}
+
+def build_scale(tonic, steps):
+    """Spell a seven-note scale on consecutive letters from tonic."""
+    letter_index = NOTES.index(tonic[0])
+    tonic_pitch = NATURAL_PITCHES[tonic[0]] + ACCIDENTAL_SHIFT[tonic[1:]]
+    scale = []
+    for degree, step in enumerate(steps):
+        note_letter = NOTES[(letter_index + degree) % 7]
+        shift = (tonic_pitch + step - NATURAL_PITCHES[note_letter] + 6) % 12 - 6
+        scale.append(note_letter + SHIFT_ACCIDENTAL[shift])
+    return scale
+
+SCALES = {key: build_scale(key, MAJOR_STEPS) for key in MAJOR_KEYS}
+SCALES.update({f"{key}m": build_scale(key, MINOR_STEPS) for key in MINOR_KEYS})
+
+# Key practice asks E and B only as naturals
+ACCIDENTAL_NOTES = ['C', 'D', 'F', 'G', 'A']
+
+# Octaves shown for each clef: C4 to B5 on treble, C2 to B3 on bass
+CLEF_OCTAVES = {'treble': [4, 5], 'bass': [2, 3]}
+
+def key_items():
+    """Every (note, accidental, clef, octave) key practice question, with the
+    probability generate_random_key() gives it when drawing uniformly."""
+    items = []
+    for note in NOTES:
+        accidentals = ACCIDENTALS if note in ACCIDENTAL_NOTES else ['']
+        for accidental in accidentals:
+            for clef in CLEFS:
+                for octave in CLEF_OCTAVES[clef]:
+                    probability = 1 / (len(NOTES) * len(accidentals) * len(CLEFS) * len(CLEF_OCTAVES[clef]))
+                    items.append(((note, accidental, clef, octave), probability))
+    return items
+
+def generate_random_key(weights=None):
+    """Generate a random key with clef for key recognition practice.
     
-    # Choose appropriate octave for each clef
-    if clef == 'treble':
-        octave = random.choice([4, 5])  # C4 to B5 range for treble
-    else:  # bass clef
-        octave = random.choice([2, 3])  # C2 to B3 range for bass
+    With a key_sampler.KeyWeights the question is drawn by its weights,
+    favouring keys that are often missed or answered slowly.
+    """
+    if weights is not None:
+        note, accidental, clef, octave = weights.sample()
+    else:
+        note = random.choice(NOTES)
+        accidental = random.choice(ACCIDENTALS) if note in ACCIDENTAL_NOTES else ''
+        clef = random.choice(CLEFS)
+        octave = random.choice(CLEF_OCTAVES[clef])
     
+    return key_question(note, accidental, clef, octave)
+
+def key_question(note, accidental, clef, octave):
+    """The key practice question dict for one note on a clef."""
     return {
         'note': note,
         'accidental': accidental,
@@ -70,67 +129,87 @@ def check_key_answer(correct_note, user_input):
 
 def generate_melody(difficulty='beginner', clef='treble'):
     """Generate a simple melody based on difficulty level."""
-    settings = DIFFICULTY_SETTINGS[difficulty]
+    return generate_melodies(1, difficulty, clef)[0]
+
+def generate_melodies(n, difficulty='beginner', clef='treble', seed=None):
+    """Generate n melodies at once, drawing every key, meter, note and rhythm in bulk.
     
-    # Choose random key and time signature
-    key_sig = random.choice(settings['key_signatures'])
-    time_sig = random.choice(settings['time_signatures'])
+    Uses NumPy's generator when it is installed and random.Random otherwise;
+    either way the same seed gives the same melodies.
+    """
+    settings = DIFFICULTY_SETTINGS[difficulty]
+    key_sigs = settings['key_signatures']
+    time_sigs = settings['time_signatures']
+    rhythms = settings['rhythms']
     measures = settings['measures']
     
-    # Generate scale for the key
-    scale = generate_scale(key_sig)
+    np = optional_numpy()
+    if np:
+        rng = np.random.default_rng(seed)
+        draw = lambda size, count: rng.integers(0, size, count).tolist()
+    else:
+        rng = random.Random(seed)
+        draw = lambda size, count: rng.choices(range(size), k=count)
     
-    # Generate melody notes
-    melody = []
-    for measure in range(measures):
-        notes_in_measure = get_notes_per_measure(time_sig)
-        for i in range(notes_in_measure):
-            note = random.choice(scale)
-            rhythm = random.choice(settings['rhythms'])
-            melody.append({
-                'note': note,
-                'rhythm': rhythm,
-                'measure': measure + 1
-            })
+    key_choices = draw(len(key_sigs), n)
+    time_choices = draw(len(time_sigs), n)
+    beats = [NOTES_PER_MEASURE.get(time_sigs[t], 4) for t in time_choices]
+    total_notes = measures * sum(beats)
+    degrees = draw(7, total_notes)
+    rhythm_choices = draw(len(rhythms), total_notes)
     
-    return {
-        'key_signature': key_sig,
-        'time_signature': time_sig,
-        'clef': clef,
-        'melody': melody,
-        'difficulty': difficulty
-    }
+    melodies = []
+    pos = 0
+    for key_choice, time_choice, per_measure in zip(key_choices, time_choices, beats):
+        key_sig = key_sigs[key_choice]
+        scale = generate_scale(key_sig)
+        count = measures * per_measure
+        melody = [{
+            'note': scale[degree],
+            'rhythm': rhythms[rhythm],
+            'measure': i // per_measure + 1
+        } for i, (degree, rhythm) in enumerate(zip(degrees[pos:pos + count], rhythm_choices[pos:pos + count]))]
+        pos += count
+        
+        melodies.append({
+            'key_signature': key_sig,
+            'time_signature': time_sigs[time_choice],
+            'clef': clef,
+            'melody': melody,
+            'difficulty': difficulty
+        })
+    
+    return melodies
 
 def generate_scale(key_signature):
-    """Generate a scale for a given key signature."""
-    # Simplified - just return basic scale notes
-    if key_signature in ['C', 'Am']:
-        return ['C', 'D', 'E', 'F', 'G', 'A', 'B']
-    elif key_signature in ['G', 'Em']:
-        return ['G', 'A', 'B', 'C', 'D', 'E', 'F#']
-    elif key_signature in ['F', 'Dm']:
-        return ['F', 'G', 'A', 'Bb', 'C', 'D', 'E']
-    else:
-        # Default to C major for other keys
-        return ['C', 'D', 'E', 'F', 'G', 'A', 'B']
+    """Return the scale for a key signature ('C', 'F#', 'Am', ...) from the precomputed table."""
+    scale = SCALES.get(key_signature) or SCALES.get(f"{key_signature}m")
+    return scale or SCALES['C']
 
 def get_notes_per_measure(time_signature):
     """Get typical number of notes per measure for time signature."""
-    if time_signature == '4/4':
-        return 4
-    elif time_signature == '3/4':
-        return 3
-    elif time_signature == '2/4':
-        return 2
-    elif time_signature == '6/8':
-        return 6
-    else:
-        return 4  # default
+    return NOTES_PER_MEASURE.get(time_signature, 4)
 
 def create_practice_pdf(melody_data, filename):
     """Create a PDF of the generated melody (simplified version)."""
+    canvas, letter = reportlab_canvas()
     c = canvas.Canvas(f"exports/{filename}", pagesize=letter)
-    width, height = letter
+    draw_practice_sheet(c, melody_data)
+    c.save()
+    return filename
+
+def render_practice_pdf(melody_data):
+    """Render one practice sheet in memory and return the PDF bytes."""
+    canvas, letter = reportlab_canvas()
+    output = io.BytesIO()
+    c = canvas.Canvas(output, pagesize=letter)
+    draw_practice_sheet(c, melody_data)
+    c.save()
+    return output.getvalue()
+
+def draw_practice_sheet(c, melody_data):
+    """Draw one practice sheet onto canvas c, ending with the page still open."""
+    width, height = reportlab_canvas()[1]
     
     # Title
     c.setFont("Helvetica-Bold", 16)
@@ -163,6 +242,23 @@ def create_practice_pdf(melody_data, filename):
         if y_pos < 100:  # Start new page if needed
             c.showPage()
             y_pos = height - 50
+
+def create_practice_workbook(melodies, output):
+    """Draw every melody into one multi-page PDF on a single canvas.
     
+    output is a path or a binary file object.
+    """
+    canvas, letter = reportlab_canvas()
+    c = canvas.Canvas(output, pagesize=letter)
+    for melody_data in melodies:
+        draw_practice_sheet(c, melody_data)
+        c.showPage()
     c.save()
-    return filename
\ No newline at end of file
+    return output
+
+def create_practice_zip(melodies, output):
+    """Write each melody as its own PDF into a ZIP archive at output."""
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+        for number, melody_data in enumerate(melodies, 1):
+            archive.writestr(f"practice_sheet_{number:03d}.pdf", render_practice_pdf(melody_data))
+    return output
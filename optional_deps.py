@@ -0,0 +1,19 @@
+"""
+Optional dependencies, imported on first use.
+NumPy only speeds things up, so callers fall back to pure Python when it is
+missing, and importing the app doesn't pay for it until it is needed.
+"""
+
+_numpy = None
+
+
+def optional_numpy():
+    """Return NumPy if it is installed, else False."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
@@ -0,0 +1,135 @@
+"""
+Streaming reader for the practice log (data.csv).
+Rows are parsed with csv.reader one at a time, so quoted notes with commas
+survive and memory stays flat no matter how long the history gets.
+"""
+
+import csv
+import io
+import json
+import os
+import re
+from collections import namedtuple
+
+PRACTICE_COLUMNS = ['timestamp', 'type', 'score', 'difficulty', 'clef',
+                    'correct_answer', 'user_answer', 'key_signature',
+                    'time_signature', 'session_id', 'response_time_ms', 'notes']
+
+PracticeRecord = namedtuple('PracticeRecord', PRACTICE_COLUMNS,
+                            defaults=[''] * len(PRACTICE_COLUMNS))
+
+# Legacy key practice rows kept the answer in the notes column
+LEGACY_ANSWER = re.compile(r'Key:\s*([^,]*),\s*Answer:\s*(.*)')
+
+
+def to_record(row):
+    """Convert a raw CSV row from any schema into a PracticeRecord."""
+    if len(row) >= 12:
+        # Current schema
+        return PracticeRecord(*row[:11], ','.join(row[11:]))
+
+    if len(row) == 11:
+        # Schema before response_time_ms was added
+        return PracticeRecord(*row[:10], '', row[10])
+
+    if len(row) >= 5:
+        # Legacy schema: timestamp, type, score, difficulty, notes
+        notes = ','.join(row[4:])
+        correct_answer, user_answer = '', ''
+        match = LEGACY_ANSWER.match(notes)
+        if match:
+            correct_answer, user_answer = match.group(1).strip(), match.group(2).strip()
+        return PracticeRecord(timestamp=row[0], type=row[1], score=row[2],
+                              difficulty=row[3], correct_answer=correct_answer,
+                              user_answer=user_answer, notes=notes)
+
+    return None
+
+
+class CSVTailReader:
+    """Yields parsed rows from an append-only CSV file, remembering the byte offset reached.
+
+    Each call to read() picks up where the previous one stopped, so only rows
+    appended since then are parsed. A trailing line without a newline is a
+    row still being written and is left for the next read.
+    """
+
+    def __init__(self, path, parse, header_field, offset=0):
+        self.path = path
+        self.parse = parse
+        self.header_field = header_field
+        self.offset = offset
+        self._consumed = offset
+
+    def has_new_rows(self):
+        """Cheap check for bytes appended since the last read."""
+        try:
+            return os.path.getsize(self.path) != self.offset
+        except OSError:
+            return False
+
+    def read(self):
+        """Yield parsed rows for every complete line after the checkpoint."""
+        if not self.has_new_rows():
+            return
+
+        if os.path.getsize(self.path) < self.offset:
+            # File was truncated or replaced, start over
+            self.offset = 0
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            self._consumed = self.offset
+            for row in csv.reader(self._complete_lines(f)):
+                self.offset = self._consumed
+                if not row or row[0] == self.header_field:  # blank line or header
+                    continue
+                record = self.parse(row)
+                if record:
+                    yield record
+
+    def _complete_lines(self, f):
+        """Decode newline-terminated lines, counting the bytes consumed."""
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            self._consumed += len(line)
+            yield line.decode('utf-8', errors='replace')
+
+
+class PracticeLogReader(CSVTailReader):
+    """Tails data.csv, yielding PracticeRecords."""
+
+    def __init__(self, path, offset=0):
+        super().__init__(path, to_record, 'timestamp', offset)
+
+
+def iter_practice_records(path):
+    """Stream every record in the practice log from the beginning."""
+    return PracticeLogReader(path).read()
+
+
+def encode_csv(records, chunk_rows=1000):
+    """Yield records as CSV text with a header, chunk_rows rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PRACTICE_COLUMNS)
+    for i, record in enumerate(records, 1):
+        writer.writerow(record)
+        if i % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_ndjson(records, chunk_rows=1000):
+    """Yield records as newline-delimited JSON objects, chunk_rows per chunk."""
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record._asdict(), ensure_ascii=False))
+        if len(lines) == chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
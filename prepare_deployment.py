@@ -6,6 +6,11 @@ Ensures all files are ready for Render deployment
 
 import os
 import subprocess
+import sys
+
+# Cold start budget: Render's free tier spins the app down when idle, so the
+# first request after a spin-up waits for the interpreter to import the app
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 1000))
 
 def check_and_create_exports_dir():
     """Ensure exports directory exists with .gitkeep."""
@@ -87,6 +92,41 @@ def test_app_locally():
         print(f"❌ App import failed: {e}")
         return False
 
+def parse_import_times(stderr):
+    """Parse `python -X importtime` output into {module: (self_us, cumulative_us)}."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the column header
+        times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return times
+
+def check_import_time():
+    """Measure `import app` with -X importtime and enforce IMPORT_BUDGET_MS."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print("❌ App import failed:")
+        print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "   (no output)")
+        return False
+
+    times = parse_import_times(result.stderr)
+    total_ms = times.get('app', (0, 0))[1] / 1000
+    print(f"⏱️  import app: {total_ms:.0f}ms (budget {IMPORT_BUDGET_MS:.0f}ms)")
+    print("   Slowest imports (cumulative):")
+    top_level = [(cumulative, name) for name, (_, cumulative) in times.items() if '.' not in name]
+    for cumulative, name in sorted(top_level, reverse=True)[:10]:
+        print(f"   {cumulative / 1000:8.1f}ms  {name}")
+
+    if total_ms > IMPORT_BUDGET_MS:
+        print("❌ App import is over the cold start budget; import heavy modules lazily")
+        return False
+    print("✅ App import within the cold start budget")
+    return True
+
 def main():
     print("🎹 Piano Practice App - Deployment Preparation")
     print("=" * 50)
@@ -96,6 +136,7 @@ def main():
         ("Creating exports directory", check_and_create_exports_dir),
         ("Checking required files", check_required_files),
         ("Testing app locally", test_app_locally),
+        ("Measuring import time", check_import_time),
         ("Checking git status", check_git_status),
     ]
     
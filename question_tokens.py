@@ -0,0 +1,56 @@
+"""
+Signed key practice question tokens.
+A token carries the question (note, accidental, clef, octave), the time it
+was issued and a random nonce, with an HMAC-SHA256 signature over them, so
+an answer can be checked and timed by any worker without keeping the
+question server side.
+Clients can fetch several questions ahead and answer them in any order.
+"""
+
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+
+SIGNATURE_BYTES = 16
+# Tells apart tokens for the same question issued at the same moment, so each can be answered once
+NONCE_BYTES = 6
+
+
+class InvalidToken(ValueError):
+    """Raised for a token that is malformed, tampered with or expired."""
+
+
+class QuestionSigner:
+    """Issues and verifies question tokens signed with a secret key."""
+
+    def __init__(self, secret, ttl=3600):
+        self.secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.ttl = ttl
+
+    def _signature(self, payload):
+        digest = hmac.new(self.secret, payload.encode('utf-8'), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:SIGNATURE_BYTES]).decode('ascii').rstrip('=')
+
+    def issue(self, key, issued_at=None):
+        """Return a token for a generated key dict, issued now unless issued_at is given."""
+        issued_ms = round((time.time() if issued_at is None else issued_at) * 1000)
+        nonce = secrets.token_urlsafe(NONCE_BYTES)
+        payload = f"{key['note']}{key['accidental']}.{key['clef']}.{key['octave']}.{issued_ms}.{nonce}"
+        return f"{payload}.{self._signature(payload)}"
+
+    def verify(self, token, ttl=None):
+        """Return ((note, accidental, clef, octave), issued_at) for a valid token.
+
+        Tokens older than ttl seconds (the signer's ttl by default) are rejected.
+        """
+        payload, _, signature = str(token).rpartition('.')
+        if not payload or not hmac.compare_digest(signature, self._signature(payload)):
+            raise InvalidToken("Invalid question token")
+
+        name, clef, octave, issued_ms, _ = payload.split('.')
+        issued_at = int(issued_ms) / 1000
+        if time.time() - issued_at > (self.ttl if ttl is None else ttl):
+            raise InvalidToken("Question token expired")
+        return (name[0], name[1:], clef, int(octave)), issued_at
@@ -0,0 +1,156 @@
+"""
+Per-user practice log shards.
+With sharding on, every practice row and session summary is also appended
+to the writing user's own shard: a directory holding the same data.csv /
+sessions.csv / daily_stats.csv files as the global CSV storage. The dashboard
+views of a user are built from that shard alone when the user first asks for
+them and then follow it from a checkpoint, so their cost scales with one
+student's history rather than everyone's.
+
+manifest.json maps each user to their shard directory. Directory names are
+hashes of the user id, so ids never end up in paths.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+import key_sampler
+import stats_engine
+import storage
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; the manifest lock is then per process only
+    fcntl = None
+
+MANIFEST_VERSION = 1
+
+# The views the dashboard endpoints read, for the whole log or one shard
+ViewSet = namedtuple('ViewSet', ['stats', 'daily', 'sessions', 'graph', 'keys'])
+
+
+def shard_name(user):
+    """Directory name of a user's shard."""
+    return hashlib.sha256(user.encode('utf-8')).hexdigest()[:24]
+
+
+class UserShard:
+    """One user's shard files plus views over them, loaded on first sync."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.storage = storage.CSVStorage(os.path.join(directory, 'data.csv'),
+                                          os.path.join(directory, 'sessions.csv'),
+                                          os.path.join(directory, 'daily_stats.csv'),
+                                          archive_dir=os.path.join(directory, 'archive'))
+        self.views = ViewSet(stats_engine.PracticeStats(), stats_engine.DailyRollup(),
+                             stats_engine.SessionIndex(min_questions=5), stats_engine.GraphSeries(),
+                             key_sampler.KeyWeights())
+        self.lock = threading.Lock()
+        self.reader = None
+        self.sessions_reader = None
+
+    def sync(self):
+        """Fold rows appended to the shard since the last sync into its views."""
+        views = self.views
+        with self.lock:
+            if self.reader is None:
+                self.sessions_reader = self.storage.sessions_reader()
+                self.reader = self.storage.bootstrap({'stats': views.stats, 'daily': views.daily,
+                                                      'sessions': views.sessions, 'keys': views.keys})
+            for record in self.reader.read():
+                for view in (views.stats, views.daily, views.sessions, views.keys):
+                    view.add(record)
+            for summary in self.sessions_reader.read():
+                views.sessions.add_saved(summary)
+                views.graph.add(summary)
+            if os.path.isdir(self.directory):
+                self.storage.replace_daily_stats(views.daily.take_dirty())
+
+    def version(self):
+        """The shard readers' checkpoints, which advance on every write to it."""
+        self.sync()
+        return (self.reader.offset, self.sessions_reader.offset)
+
+
+class ShardedPracticeLog:
+    """Routes rows to per-user shards and keeps the most recently used shards loaded."""
+
+    def __init__(self, directory='shards', max_loaded=256):
+        self.directory = directory
+        self.max_loaded = max_loaded
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.lock = threading.Lock()
+        self.loaded = OrderedDict()  # user -> UserShard, least recently used first
+        self.loads = 0
+        self.evictions = 0
+
+    def shard(self, user):
+        """The user's shard, loaded from disk on first use (it may have no rows yet)."""
+        with self.lock:
+            shard = self.loaded.get(user)
+            if shard is not None:
+                self.loaded.move_to_end(user)
+                return shard
+            shard = self.loaded[user] = UserShard(os.path.join(self.directory, shard_name(user)))
+            self.loads += 1
+            while len(self.loaded) > self.max_loaded:
+                self.loaded.popitem(last=False)
+                self.evictions += 1
+            return shard
+
+    def append_practice(self, entries):
+        """Append (user, practice row) pairs, one write per user."""
+        for user, rows in self._by_user(entries).items():
+            self._create(user).append_practice(rows)
+
+    def append_sessions(self, user, rows):
+        """Append session summary rows to one user's shard."""
+        self._create(user).append_sessions(rows)
+
+    def _by_user(self, entries):
+        groups = {}
+        for user, row in entries:
+            groups.setdefault(user, []).append(row)
+        return groups
+
+    def _create(self, user):
+        """The storage of a user's shard, creating the shard and its manifest entry if new."""
+        shard = self.shard(user)
+        if not os.path.isdir(shard.directory):
+            os.makedirs(shard.directory, exist_ok=True)
+            shard.storage.init()
+            self._register(user, os.path.basename(shard.directory))
+        return shard.storage
+
+    def manifest(self):
+        """The manifest: {'version': ..., 'shards': {user: {'dir': ..., 'created': ...}}}."""
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': MANIFEST_VERSION, 'shards': {}}
+
+    def _register(self, user, name):
+        # Read-modify-write under a file lock, as other worker processes may add shards too
+        with self.lock, open(os.path.join(self.directory, '.manifest.lock'), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            manifest = self.manifest()
+            manifest['shards'].setdefault(user, {'dir': name, 'created': datetime.now().isoformat()})
+            tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+    def metrics(self):
+        """Loaded shard count and load / eviction counters."""
+        return {
+            'loaded': len(self.loaded),
+            'loads': self.loads,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,30 @@
+"""
+Per-thread SQLite connections shared by the storage backend and state stores.
+Every thread gets its own connection in WAL mode, reopened in a forked
+process, so readers never block the writer and no connection crosses fork().
+"""
+
+import os
+import sqlite3
+import threading
+
+
+class ThreadConnections:
+    """One connection to a database file per thread and process."""
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self):
+        """Return this thread's connection, opening it on first use in each process."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Connections must not cross fork(); each preloaded worker opens its own
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
@@ -0,0 +1,154 @@
+"""
+Keyed state stores for per-client data such as the current practice question.
+MemoryStore is an in-process LRU with TTL expiry; SQLiteStore keeps the same
+data in a local database so every worker process sees it.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import sqlite_connections
+
+
+class MemoryStore:
+    """In-process LRU mapping with per-entry TTL."""
+
+    def __init__(self, maxsize=10000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.time():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        """Store value under key, evicting expired and least recently used entries."""
+        with self.lock:
+            self._put(key, value, time.time())
+
+    def add(self, key, value):
+        """Store value under key unless it holds a live value; return True if stored."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                return False
+            self._put(key, value, now)
+            return True
+
+    def _put(self, key, value, now):
+        # Called with the lock held
+        self.entries[key] = (now + self.ttl, value)
+        self.entries.move_to_end(key)
+        while self.entries:
+            oldest_key, (expires_at, _) = next(iter(self.entries.items()))
+            if expires_at > now and len(self.entries) <= self.maxsize:
+                break
+            del self.entries[oldest_key]
+
+    def pop(self, key, default=None):
+        """Remove key and return its value."""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+        if entry is None or entry[0] <= time.time():
+            return default
+        return entry[1]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteStore:
+    """Shared store in a local SQLite database; values are JSON encoded.
+
+    encode and decode convert values that aren't plain JSON (such as
+    __slots__ objects) to and from a JSON-friendly form.
+    """
+
+    PURGE_EVERY = 500  # sets between sweeps of expired rows
+
+    def __init__(self, path, table='state', ttl=3600, encode=None, decode=None):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.encode = encode
+        self.decode = decode
+        self.connections = sqlite_connections.ThreadConnections(path)
+        self._sets = 0
+        with self.connect() as conn:
+            conn.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_expires ON {table} (expires_at)')
+
+    def connect(self):
+        """Return this thread's connection, opening it on first use in each process."""
+        return self.connections.get()
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if missing or expired."""
+        row = self.connect().execute(
+            f'SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?',
+            (key, time.time())).fetchone()
+        if not row:
+            return default
+        value = json.loads(row[0])
+        return self.decode(value) if self.decode else value
+
+    def set(self, key, value):
+        """Store value under key, sweeping expired rows now and then."""
+        now = time.time()
+        conn = self.connect()
+        with conn:
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                         (key, json.dumps(self.encode(value) if self.encode else value), now + self.ttl))
+            self._sets += 1
+            if self._sets % self.PURGE_EVERY == 0:
+                conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (now,))
+
+    def add(self, key, value):
+        """Store value under key unless it holds a live value; return True if stored.
+
+        Atomic across every process sharing the database.
+        """
+        now = time.time()
+        conn = self.connect()
+        with conn:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ? AND expires_at <= ?', (key, now))
+            cursor = conn.execute(f'INSERT OR IGNORE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                                  (key, json.dumps(self.encode(value) if self.encode else value), now + self.ttl))
+        return cursor.rowcount == 1
+
+    def pop(self, key, default=None):
+        """Remove key and return its value."""
+        value = self.get(key, default)
+        with self.connect() as conn:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+        return value
+
+    def __len__(self):
+        return self.connect().execute(
+            f'SELECT COUNT(*) FROM {self.table} WHERE expires_at > ?', (time.time(),)).fetchone()[0]
+
+
+def open_store(name, table='state', path='state.db', maxsize=10000, ttl=3600, encode=None, decode=None):
+    """Return the state store selected by name ('memory' or 'sqlite').
+
+    The memory store keeps values as they are; encode/decode only apply to SQLite.
+    """
+    if name == 'sqlite':
+        return SQLiteStore(path, table=table, ttl=ttl, encode=encode, decode=decode)
+    if name == 'memory':
+        return MemoryStore(maxsize=maxsize, ttl=ttl)
+    raise ValueError(f"Unknown state store: {name}")
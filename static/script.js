@@ -4,6 +4,14 @@ let currentMelody = null;
 let score = 0;
 let totalAttempts = 0;
 let keyStartTime = null;
+let keyQueue = [];
+let keyRefill = null;
+// Keys kept ahead of the current one, so this many can be answered while offline
+// (at most the server's KEY_PREFETCH_MAX, 10 by default)
+const KEY_PREFETCH = 10;
+const KEY_BATCH_SIZE = 100;
+let pendingAnswers = JSON.parse(localStorage.getItem('pendingAnswers') || '[]');
+let answerSync = null;
 let progressChart = null;
 
 // Initialize VexFlow
@@ -74,7 +82,8 @@ async function loadStatsModal() {
 
 async function loadProgressChart() {
     try {
-        const response = await fetch('/api/graph-data');
+        // Long histories are downsampled on the server to a fixed number of points
+        const response = await fetch('/api/graph-data?points=200');
         const data = await response.json();
         
         const ctx = document.getElementById('progress-chart').getContext('2d');
@@ -86,7 +95,7 @@ async function loadProgressChart() {
         progressChart = new Chart(ctx, {
             type: 'line',
             data: {
-                labels: data.map((d, i) => `Session ${i + 1}`),
+                labels: data.map(d => d.session ? `Session ${d.session}` : d.date),
                 datasets: [{
                     label: 'Accuracy (%)',
                     data: data.map(d => d.accuracy),
@@ -295,10 +304,32 @@ function initKeyPractice() {
     document.getElementById('new-key-btn').addEventListener('click', generateNewKey);
 }
 
+// Top the queue of signed questions back up to KEY_PREFETCH, one request at a time
+function refillKeyQueue() {
+    if (!keyRefill) {
+        const count = Math.max(KEY_PREFETCH - keyQueue.length, 1);
+        keyRefill = fetch(`/api/key/new?count=${count}`)
+            .then(response => {
+                if (!response.ok) throw new Error(`Fetching keys failed: ${response.status}`);
+                return response.json();
+            })
+            .then(data => { keyQueue.push(...data.questions); })
+            .finally(() => { keyRefill = null; });
+    }
+    return keyRefill;
+}
+
 async function generateNewKey() {
     try {
-        const response = await fetch('/api/key/new');
-        currentKey = await response.json();
+        if (keyQueue.length === 0) {
+            await refillKeyQueue();
+        }
+        currentKey = keyQueue.shift();
+        
+        // Top up in the background, so a full queue is at hand if the connection drops
+        if (keyQueue.length < KEY_PREFETCH) {
+            refillKeyQueue().catch(error => console.error('Error prefetching keys:', error));
+        }
         
         // Clear previous feedback
         hideFeedback();
@@ -306,12 +337,23 @@ async function generateNewKey() {
         
         // Draw the key on staff
         drawKeyOnStaff(currentKey);
+        keyStartTime = performance.now();
         
     } catch (error) {
         console.error('Error generating new key:', error);
+        showOutOfKeys();
     }
 }
 
+// The prefetched keys ran out and no more could be fetched (e.g. still offline)
+function showOutOfKeys() {
+    const feedback = document.getElementById('feedback');
+    feedback.classList.remove('hidden', 'correct', 'incorrect');
+    document.getElementById('feedback-message').textContent = '📡 No more questions offline';
+    document.getElementById('feedback-details').textContent =
+        'Your answers are saved and will be sent when you reconnect. Press "New Key" to continue.';
+}
+
 function drawKeyOnStaff(keyData) {
     const container = document.getElementById('staff-display');
     
@@ -382,16 +424,49 @@ function drawKeyOnStaff(keyData) {
 async function checkKeyAnswer(userAnswer) {
     if (!currentKey) return;
     
+    // Each key is answered once; further clicks wait for the next one
+    const key = currentKey;
+    currentKey = null;
+    const answer = {
+        answer: userAnswer,
+        token: key.token,
+        response_time_ms: Math.round(performance.now() - keyStartTime),
+        answered_at: Date.now()
+    };
+    
     try {
-        const response = await fetch('/api/key/check', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ answer: userAnswer })
-        });
-        
-        const result = await response.json();
+        let result;
+        try {
+            const response = await fetch('/api/key/check', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(answer)
+            });
+            if (!response.ok) {
+                // The question expired or was rejected; the prefetched ones are as old, so start afresh
+                console.error('Answer not accepted:', response.status);
+                keyQueue = [];
+                generateNewKey();
+                return;
+            }
+            result = await response.json();
+            syncPendingAnswers().catch(error => console.error('Error syncing answers:', error));
+        } catch (error) {
+            // Only a network failure (a TypeError from fetch) means offline; anything else
+            // reached the server and must not be sent again
+            if (!(error instanceof TypeError)) throw error;
+            
+            // Offline: grade locally and send the answer with the next batch
+            pendingAnswers.push(answer);
+            savePendingAnswers();
+            result = {
+                correct: userAnswer.toUpperCase() === key.note,
+                correct_answer: key.display_name,
+                user_answer: userAnswer
+            };
+        }
         
         // Update score
         totalAttempts++;
@@ -416,6 +491,39 @@ async function checkKeyAnswer(userAnswer) {
     }
 }
 
+// Offline answers are kept in localStorage and sent with /api/key/check-batch
+function savePendingAnswers() {
+    localStorage.setItem('pendingAnswers', JSON.stringify(pendingAnswers));
+}
+
+// One sync at a time; answers given meanwhile go with the next batch
+function syncPendingAnswers() {
+    if (!answerSync) {
+        answerSync = sendPendingAnswers().finally(() => { answerSync = null; });
+    }
+    return answerSync;
+}
+
+async function sendPendingAnswers() {
+    while (pendingAnswers.length > 0) {
+        const batch = pendingAnswers.slice(0, KEY_BATCH_SIZE);
+        const response = await fetch('/api/key/check-batch', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ answers: batch })
+        });
+        if (!response.ok) return;
+        pendingAnswers = pendingAnswers.slice(batch.length);
+        savePendingAnswers();
+    }
+}
+
+window.addEventListener('online', () => {
+    syncPendingAnswers().catch(error => console.error('Error syncing answers:', error));
+});
+
 function showFeedback(result) {
     const feedback = document.getElementById('feedback');
     const message = document.getElementById('feedback-message');
@@ -602,7 +710,8 @@ async function exportPDF() {
     if (!currentMelody) return;
     
     try {
-        const response = await fetch('/api/melody/export', {
+        // Queue the render, then poll until the PDF is ready
+        const submit = await fetch('/api/melody/export-jobs', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -610,7 +719,15 @@ async function exportPDF() {
             body: JSON.stringify(currentMelody)
         });
         
-        if (response.ok) {
+        let job = await submit.json();
+        while (submit.ok && job.status === 'queued') {
+            await new Promise(resolve => setTimeout(resolve, 500));
+            job = await (await fetch(job.status_url)).json();
+        }
+        
+        const response = job.download_url ? await fetch(job.download_url) : null;
+        
+        if (response && response.ok) {
             // Download the PDF
             const blob = await response.blob();
             const url = window.URL.createObjectURL(blob);
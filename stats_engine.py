@@ -0,0 +1,520 @@
+"""
+In-memory practice statistics for the dashboard.
+Counters are loaded once at startup and updated as rows are logged,
+so /api/stats, /api/daily-stats, /api/sessions and /api/graph-data never
+have to rescan data.csv or sessions.csv.
+"""
+
+import bisect
+import threading
+from collections import OrderedDict, deque
+from datetime import date as Date, datetime, timedelta
+
+RECENT_LIMIT = 10
+
+# Gaps between logged rows longer than this don't count as practice time
+IDLE_GAP_SECONDS = 300
+
+
+def _is_correct(score):
+    """Return True if a logged score counts as a correct answer."""
+    try:
+        return bool(score) and float(score) == 1
+    except ValueError:
+        return False
+
+
+def _response_time(value):
+    """Return the response time of a row as a float, or None if missing."""
+    if value and value.replace('.', '').isdigit():
+        return float(value)
+    return None
+
+
+class PracticeStats:
+    """Running counters over every row of the practice log."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all counters."""
+        with self.lock:
+            self.rows = 0
+            self.by_type = {}        # type -> row count
+            self.by_clef = {}        # key_practice clef -> [answers, correct]
+            self.key_answers = 0
+            self.key_correct = 0
+            self.time_sum = 0.0
+            self.time_count = 0
+            self.recent = deque(maxlen=RECENT_LIMIT)
+
+    def load(self, records):
+        """Rebuild the counters from an iterable of log records."""
+        self.reset()
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        """Fold one PracticeRecord into the counters."""
+        practice_type = record.type
+        with self.lock:
+            self.rows += 1
+            self.by_type[practice_type] = self.by_type.get(practice_type, 0) + 1
+            if practice_type == 'session_start':
+                return
+
+            self.recent.append(record)
+            if practice_type != 'key_practice':
+                return
+
+            correct = _is_correct(record.score)
+            self.key_answers += 1
+            self.key_correct += correct
+
+            clef_counts = self.by_clef.setdefault(record.clef, [0, 0])
+            clef_counts[0] += 1
+            clef_counts[1] += correct
+
+            response_time = _response_time(record.response_time_ms)
+            if response_time is not None:
+                self.time_sum += response_time
+                self.time_count += 1
+
+    def add_aggregate(self, practice_type, clef, rows, correct, time_sum, time_count):
+        """Fold pre-aggregated counts for one (type, clef) pair into the counters."""
+        with self.lock:
+            self.rows += rows
+            self.by_type[practice_type] = self.by_type.get(practice_type, 0) + rows
+            if practice_type != 'key_practice':
+                return
+
+            self.key_answers += rows
+            self.key_correct += correct
+
+            clef_counts = self.by_clef.setdefault(clef, [0, 0])
+            clef_counts[0] += rows
+            clef_counts[1] += correct
+
+            self.time_sum += time_sum
+            self.time_count += time_count
+
+    def clef_accuracy(self, clef):
+        """Accuracy percentage for key practice on one clef."""
+        answers, correct = self.by_clef.get(clef, (0, 0))
+        return round((correct / answers) * 100, 1) if answers else 0
+
+    def snapshot(self):
+        """Return the aggregate part of the /api/stats payload."""
+        with self.lock:
+            return {
+                'total_sessions': self.rows - self.by_type.get('session_start', 0),
+                'key_practice_accuracy': round((self.key_correct / self.key_answers) * 100, 1) if self.key_answers else 0,
+                'treble_accuracy': self.clef_accuracy('treble'),
+                'bass_accuracy': self.clef_accuracy('bass'),
+                'avg_response_time': round(self.time_sum / self.time_count, 0) if self.time_count else 0,
+                'sight_reading_generated': self.by_type.get('sight_reading_generated', 0),
+                'pdfs_exported': self.by_type.get('pdf_export', 0),
+                'recent_sessions': [{
+                    'timestamp': r.timestamp,
+                    'type': r.type,
+                    'score': r.score,
+                    'difficulty': r.difficulty,
+                    'clef': r.clef,
+                    'correct_answer': r.correct_answer,
+                    'user_answer': r.user_answer,
+                    'response_time': r.response_time_ms,
+                    'notes': r.notes
+                } for r in self.recent]
+            }
+
+
+class DayTotals:
+    """Running totals for one calendar day."""
+
+    __slots__ = ('session_ids', 'questions', 'correct', 'time_sum', 'time_count',
+                 'active_seconds', 'last_seen')
+
+    def __init__(self):
+        self.session_ids = set()
+        self.questions = 0
+        self.correct = 0
+        self.time_sum = 0.0
+        self.time_count = 0
+        self.active_seconds = 0.0
+        self.last_seen = {}  # session id -> latest row time in that session
+
+    def as_dict(self, date):
+        return {
+            'date': date,
+            'total_sessions': len(self.session_ids),
+            'total_questions': self.questions,
+            'accuracy': round((self.correct / self.questions) * 100, 1) if self.questions else 0,
+            'avg_response_time': round(self.time_sum / self.time_count, 0) if self.time_count else 0,
+            'practice_time_minutes': round(self.active_seconds / 60, 1)
+        }
+
+
+class DailyRollup:
+    """Per-day totals, accuracy, response time and practice minutes.
+
+    Practice minutes are the time between consecutive logged rows of the
+    same session on the same day, ignoring gaps longer than IDLE_GAP_SECONDS,
+    so students practicing at the same time don't add up to one long stretch.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear every day."""
+        with self.lock:
+            self.days = {}      # 'YYYY-MM-DD' -> DayTotals
+            self.dates = []     # sorted keys of days
+            self.dirty = set()  # days changed since take_dirty()
+
+    def rebuild(self, records):
+        """Rebuild every day from an iterable of log records in one pass."""
+        self.reset()
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        """Fold one PracticeRecord into its day."""
+        try:
+            seen = datetime.fromisoformat(record.timestamp)
+        except ValueError:
+            return
+        date = record.timestamp[:10]
+
+        with self.lock:
+            day = self.days.get(date)
+            if day is None:
+                day = self.days[date] = DayTotals()
+                bisect.insort(self.dates, date)
+            self.dirty.add(date)
+
+            last_seen = day.last_seen.get(record.session_id)
+            if last_seen is not None:
+                gap = (seen - last_seen).total_seconds()
+                if 0 < gap <= IDLE_GAP_SECONDS:
+                    day.active_seconds += gap
+            if last_seen is None or seen > last_seen:
+                day.last_seen[record.session_id] = seen
+
+            if record.type != 'key_practice':
+                return
+
+            if record.session_id:
+                day.session_ids.add(record.session_id)
+            day.questions += 1
+            day.correct += _is_correct(record.score)
+            response_time = _response_time(record.response_time_ms)
+            if response_time is not None:
+                day.time_sum += response_time
+                day.time_count += 1
+
+    def range(self, start=None, end=None):
+        """Daily rows with start <= date <= end (inclusive, 'YYYY-MM-DD' strings)."""
+        with self.lock:
+            lo = bisect.bisect_left(self.dates, start) if start else 0
+            hi = bisect.bisect_right(self.dates, end) if end else len(self.dates)
+            return [self.days[date].as_dict(date) for date in self.dates[lo:hi]]
+
+    def take_dirty(self):
+        """Return rows for days changed since the last call, and clear the set."""
+        with self.lock:
+            rows = [self.days[date].as_dict(date) for date in sorted(self.dirty)]
+            self.dirty = set()
+            return rows
+
+
+class SessionTotals:
+    """Running totals for one practice session."""
+
+    __slots__ = ('questions', 'correct', 'time_sum', 'time_count', 'start_time', 'end_time')
+
+    def __init__(self, start_time=''):
+        self.questions = 0
+        self.correct = 0
+        self.time_sum = 0.0
+        self.time_count = 0
+        self.start_time = start_time
+        self.end_time = start_time
+
+    def accuracy(self):
+        return round((self.correct / self.questions) * 100, 1) if self.questions else 0
+
+    def avg_response_time(self):
+        return round(self.time_sum / self.time_count, 0) if self.time_count else 0
+
+    def as_dict(self, session_id):
+        return {
+            'session_id': session_id,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'session_type': 'key_practice',
+            'total_questions': self.questions,
+            'correct_answers': self.correct,
+            'accuracy': self.accuracy(),
+            'avg_response_time': self.avg_response_time(),
+            'difficulty': 'mixed',
+            'clef': 'mixed'
+        }
+
+
+class SessionCounters:
+    """Counters for a client's current practice session, kept server side."""
+
+    __slots__ = ('session_id', 'start_time', 'questions', 'correct', 'time_sum')
+
+    def __init__(self, session_id, start_time, questions=0, correct=0, time_sum=0.0):
+        self.session_id = session_id
+        self.start_time = start_time
+        self.questions = questions
+        self.correct = correct
+        self.time_sum = time_sum
+
+    def add(self, correct, response_time):
+        """Count one answer and its response time in ms."""
+        self.questions += 1
+        if correct:
+            self.correct += 1
+        self.time_sum += response_time
+
+    def accuracy(self):
+        return round((self.correct / self.questions) * 100, 1) if self.questions else 0
+
+    def avg_response_time(self):
+        return round(self.time_sum / self.questions, 0) if self.questions else 0
+
+    def to_list(self):
+        """Compact JSON-friendly form for shared state stores."""
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+
+class SessionIndex:
+    """Per-session accumulators for key practice plus the saved session summaries.
+
+    Sessions are listed in the order they were first seen. A saved summary
+    (from sessions.csv) replaces the live accumulator of the same session;
+    live sessions are only listed once they reach min_questions answers.
+    """
+
+    def __init__(self, min_questions=5):
+        self.min_questions = min_questions
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every session."""
+        with self.lock:
+            self.order = []       # session ids in first-seen order
+            self.position = {}    # session id -> index in order
+            self.live = {}        # session id -> SessionTotals
+            self.saved = {}       # session id -> saved summary dict
+
+    def _track(self, session_id):
+        if session_id not in self.position:
+            self.position[session_id] = len(self.order)
+            self.order.append(session_id)
+
+    def add(self, record):
+        """Fold one PracticeRecord into its session's accumulator."""
+        if record.type != 'key_practice':
+            return
+        with self.lock:
+            totals = self.live.get(record.session_id)
+            if totals is None:
+                totals = self.live[record.session_id] = SessionTotals(record.timestamp)
+                self._track(record.session_id)
+
+            totals.questions += 1
+            totals.correct += _is_correct(record.score)
+            totals.end_time = record.timestamp
+            response_time = _response_time(record.response_time_ms)
+            if response_time is not None:
+                totals.time_sum += response_time
+                totals.time_count += 1
+
+    def add_aggregate(self, session_id, questions, correct, time_sum, time_count, start_time, end_time):
+        """Fold pre-aggregated counts for one session into its accumulator."""
+        with self.lock:
+            totals = self.live.get(session_id)
+            if totals is None:
+                totals = self.live[session_id] = SessionTotals(start_time)
+                self._track(session_id)
+            totals.questions += questions
+            totals.correct += correct
+            totals.time_sum += time_sum
+            totals.time_count += time_count
+            totals.end_time = end_time
+
+    def add_saved(self, summary):
+        """Record a session summary persisted by end_session()."""
+        with self.lock:
+            self.saved[summary['session_id']] = summary
+            self._track(summary['session_id'])
+
+    def page(self, after=None, limit=50):
+        """Return (summaries, next_after) for up to limit sessions after the given id.
+
+        Raises KeyError if after is not a known session id.
+        """
+        with self.lock:
+            start = self.position[after] + 1 if after is not None else 0
+            summaries = []
+            i = start
+            while i < len(self.order) and len(summaries) < limit:
+                session_id = self.order[i]
+                i += 1
+                if session_id in self.saved:
+                    summaries.append(self.saved[session_id])
+                elif self.live[session_id].questions >= self.min_questions:
+                    summaries.append(self.live[session_id].as_dict(session_id))
+
+            next_after = summaries[-1]['session_id'] if summaries and i < len(self.order) else None
+            return summaries, next_after
+
+
+def _to_float(value):
+    try:
+        return float(value or 0)
+    except ValueError:
+        return 0.0
+
+
+def lttb(points, threshold, key):
+    """Downsample points to threshold items with Largest-Triangle-Three-Buckets on key."""
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third triangle vertex
+        next_start, next_end = end, min(int((i + 2) * bucket_size) + 1, len(points))
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(key(p) for p in points[next_start:next_end]) / (next_end - next_start)
+
+        ax, ay = a, key(points[a])
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (key(points[j]) - ay) - (ax - j) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+class GraphSeries:
+    """Precomputed chart points for saved sessions, with day and week buckets.
+
+    Query results are cached until the next session is added.
+    """
+
+    GROUPS = ('day', 'week')
+    CACHE_SIZE = 64
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every point."""
+        with self.lock:
+            self.keys = []      # (date, session number), sorted
+            self.points = []    # chart points, same order as keys
+            self.buckets = {group: {} for group in self.GROUPS}   # group -> key -> [count, acc, time]
+            self.bucket_keys = {group: [] for group in self.GROUPS}
+            self.cache = OrderedDict()
+
+    def add(self, summary):
+        """Add a saved session summary as the next chart point."""
+        start_time = summary.get('start_time') or ''
+        point = {
+            'session': len(self.points) + 1,
+            'accuracy': _to_float(summary.get('accuracy')),
+            'response_time': _to_float(summary.get('avg_response_time')),
+            'date': start_time[:10]
+        }
+        with self.lock:
+            key = (point['date'], point['session'])
+            index = bisect.bisect_right(self.keys, key)
+            self.keys.insert(index, key)
+            self.points.insert(index, point)
+
+            if point['date']:
+                for group in self.GROUPS:
+                    bucket_key = self._bucket_key(group, point['date'])
+                    if bucket_key is None:
+                        continue
+                    bucket = self.buckets[group].get(bucket_key)
+                    if bucket is None:
+                        bucket = self.buckets[group][bucket_key] = [0, 0.0, 0.0]
+                        bisect.insort(self.bucket_keys[group], bucket_key)
+                    bucket[0] += 1
+                    bucket[1] += point['accuracy']
+                    bucket[2] += point['response_time']
+
+            self.cache.clear()
+
+    @staticmethod
+    def _bucket_key(group, date):
+        if group == 'day':
+            return date
+        try:
+            day = Date.fromisoformat(date)
+        except ValueError:
+            return None
+        return (day - timedelta(days=day.weekday())).isoformat()  # Monday of the week
+
+    def query(self, start=None, end=None, group=None, points=None):
+        """Chart points within [start, end], optionally grouped by day/week and downsampled."""
+        cache_key = (start, end, group, points)
+        with self.lock:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.cache.move_to_end(cache_key)
+                return cached
+
+            if group:
+                keys = self.bucket_keys[group]
+                lo = bisect.bisect_left(keys, start) if start else 0
+                hi = bisect.bisect_right(keys, end) if end else len(keys)
+                series = []
+                for bucket_key in keys[lo:hi]:
+                    count, accuracy, response_time = self.buckets[group][bucket_key]
+                    series.append({
+                        'date': bucket_key,
+                        'sessions': count,
+                        'accuracy': round(accuracy / count, 1),
+                        'response_time': round(response_time / count, 0)
+                    })
+            else:
+                lo = bisect.bisect_left(self.keys, (start,)) if start else 0
+                hi = bisect.bisect_left(self.keys, (end + '\uffff',)) if end else len(self.keys)
+                series = self.points[lo:hi]
+
+            if points:
+                series = lttb(series, points, key=lambda p: p['accuracy'])
+            else:
+                series = list(series)
+
+            self.cache[cache_key] = series
+            if len(self.cache) > self.CACHE_SIZE:
+                self.cache.popitem(last=False)
+            return series
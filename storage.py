@@ -0,0 +1,379 @@
+"""
+Storage backends for practice data.
+CSVStorage keeps the original data.csv / sessions.csv / daily_stats.csv files;
+SQLiteStorage keeps the same tables in one WAL-mode database with indexes,
+so stats bootstrap, session grouping and recent-row queries are indexed.
+sessions.csv is tailed the same way as data.csv, and rows rotated out of
+data.csv are read back from the columnar archive (see log_archive.py).
+
+Both backends bootstrap the in-memory views (objects with an add(record)
+method, keyed by name) and hand back a reader positioned after the rows
+they have seen, so the views can follow new rows from there.
+"""
+
+import csv
+import io
+import os
+from datetime import timedelta
+from itertools import chain
+
+import log_archive
+import practice_log
+import sqlite_connections
+from practice_log import PRACTICE_COLUMNS, PracticeRecord
+
+SESSION_COLUMNS = ['session_id', 'start_time', 'end_time', 'session_type',
+                   'total_questions', 'correct_answers', 'accuracy',
+                   'avg_response_time', 'difficulty', 'clef']
+
+DAILY_STATS_COLUMNS = ['date', 'total_sessions', 'total_questions', 'accuracy',
+                       'avg_response_time', 'practice_time_minutes']
+
+
+def to_session(row):
+    """Convert a raw sessions.csv row into a summary dict."""
+    return dict(zip(SESSION_COLUMNS, row))
+
+
+class HistoryQuery:
+    """Filters for a history export: sets of types, clefs and session ids (empty
+    matches all) and an inclusive range of dates."""
+
+    def __init__(self, types=(), clefs=(), session_ids=(), start=None, end=None):
+        self.types = set(types)
+        self.clefs = set(clefs)
+        self.session_ids = set(session_ids)
+        # Timestamps are ISO strings, so a date range is a string range
+        self.start = start.isoformat() if start else None
+        self.before = (end + timedelta(days=1)).isoformat() if end else None
+
+    def matches(self, record):
+        """Whether a PracticeRecord passes every filter."""
+        return ((not self.types or record.type in self.types)
+                and (not self.clefs or record.clef in self.clefs)
+                and (not self.session_ids or record.session_id in self.session_ids)
+                and (self.start is None or record.timestamp >= self.start)
+                and (self.before is None or record.timestamp < self.before))
+
+    def may_match(self, dictionaries):
+        """False if an archive segment's column dictionaries rule out every row."""
+        return all(not wanted or not wanted.isdisjoint(dictionaries[column])
+                   for column, wanted in (('type', self.types), ('clef', self.clefs),
+                                          ('session_id', self.session_ids)))
+
+    def where(self):
+        """SQL WHERE clause and parameters for the same filters."""
+        clauses, params = [], []
+        for column, wanted in (('type', self.types), ('clef', self.clefs),
+                               ('session_id', self.session_ids)):
+            if wanted:
+                clauses.append(f"{column} IN ({', '.join('?' * len(wanted))})")
+                params.extend(sorted(wanted))
+        if self.start is not None:
+            clauses.append('timestamp >= ?')
+            params.append(self.start)
+        if self.before is not None:
+            clauses.append('timestamp < ?')
+            params.append(self.before)
+        return ' AND '.join(clauses) or '1', params
+
+
+class CSVStorage:
+    """Append-only CSV files, the original storage format."""
+
+    name = 'csv'
+
+    def __init__(self, csv_file, sessions_file, stats_file, archive_dir='archive'):
+        self.csv_file = csv_file
+        self.sessions_file = sessions_file
+        self.stats_file = stats_file
+        self.archive_dir = archive_dir
+
+    def init(self):
+        """Create any missing CSV files with their headers."""
+        for path, header in ((self.csv_file, PRACTICE_COLUMNS),
+                             (self.sessions_file, SESSION_COLUMNS),
+                             (self.stats_file, DAILY_STATS_COLUMNS)):
+            if not os.path.exists(path):
+                with open(path, 'w', newline='') as f:
+                    csv.writer(f).writerow(header)
+
+    def append_practice(self, rows):
+        """Append practice rows (lists in PRACTICE_COLUMNS order) in a single write."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        with open(self.csv_file, 'a', newline='') as f:
+            f.write(buffer.getvalue())
+
+    def append_sessions(self, rows):
+        """Append session summary rows (lists in SESSION_COLUMNS order)."""
+        with open(self.sessions_file, 'a', newline='') as f:
+            csv.writer(f).writerows(rows)
+
+    def practice_reader(self):
+        """Reader that tails data.csv from a byte offset."""
+        return practice_log.PracticeLogReader(self.csv_file)
+
+    def iter_practice(self):
+        """Stream every practice record, archived rows first."""
+        archive = log_archive.Archive(self.archive_dir)
+        return chain(archive.iter_records(), practice_log.iter_practice_records(self.csv_file))
+
+    def iter_history(self, query):
+        """Stream the practice records matching a HistoryQuery, skipping archive
+        segments whose dictionaries can't match."""
+        archive = log_archive.Archive(self.archive_dir)
+        archived = chain.from_iterable(segment.iter_records() for segment in archive.segments
+                                       if query.may_match(segment.dictionaries))
+        records = chain(archived, practice_log.iter_practice_records(self.csv_file))
+        return (record for record in records if query.matches(record))
+
+    def sessions_reader(self):
+        """Reader that tails sessions.csv from a byte offset."""
+        return practice_log.CSVTailReader(self.sessions_file, to_session, 'session_id')
+
+    def iter_sessions(self):
+        """Stream saved session summaries as dicts."""
+        return self._iter_dicts(self.sessions_file)
+
+    def iter_daily_stats(self):
+        """Stream daily stats rows as dicts."""
+        return self._iter_dicts(self.stats_file)
+
+    def _iter_dicts(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', newline='') as f:
+            yield from csv.DictReader(f)
+
+    def replace_daily_stats(self, rows, clear=False):
+        """Insert or overwrite daily stats rows (dicts keyed by DAILY_STATS_COLUMNS)."""
+        if not rows and not clear:
+            return
+        stored = {row['date']: row for row in self.iter_daily_stats()}
+        days = {} if clear else dict(stored)
+        days.update((row['date'], {column: str(row.get(column, '')) for column in DAILY_STATS_COLUMNS})
+                    for row in rows)
+        if days == stored:
+            return  # e.g. the rollup rebuilt at startup; don't touch the file
+
+        tmp_path = f"{self.stats_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=DAILY_STATS_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(days[date] for date in sorted(days))
+        os.replace(tmp_path, self.stats_file)
+
+    def bootstrap(self, views):
+        """Seed views from the archive, then feed the live log through every view in one
+        pass; return a reader at its end."""
+        archive = log_archive.Archive(self.archive_dir)
+        scanned = {}
+        for name, view in views.items():
+            seeder = getattr(archive, f'seed_{name}', None)
+            if seeder:
+                seeder(view)
+            else:
+                scanned[name] = view
+
+        if scanned:
+            for record in archive.iter_records():
+                for view in scanned.values():
+                    view.add(record)
+
+        reader = self.practice_reader()
+        for record in reader.read():
+            for view in views.values():
+                view.add(record)
+        return reader
+
+
+class SQLiteTableReader:
+    """Tails a table by rowid, like CSVTailReader does by byte offset."""
+
+    def __init__(self, storage, table, columns, parse, offset=0):
+        self.storage = storage
+        self.table = table
+        self.columns = columns
+        self.parse = parse
+        self.offset = offset
+
+    def has_new_rows(self):
+        row = self.storage.connect().execute(f'SELECT MAX(id) FROM {self.table}').fetchone()
+        return (row[0] or 0) > self.offset
+
+    def read(self, upto=None):
+        """Yield parsed rows for every row after the checkpoint (and up to upto)."""
+        query = f'SELECT id, {", ".join(self.columns)} FROM {self.table} WHERE id > ?'
+        params = [self.offset]
+        if upto is not None:
+            query += ' AND id <= ?'
+            params.append(upto)
+        cursor = self.storage.connect().execute(query + ' ORDER BY id', params)
+        for row in cursor:
+            self.offset = row[0]
+            yield self.parse(row[1:])
+
+
+class SQLiteStorage:
+    """Single-file SQLite database in WAL mode, one connection per thread."""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self.connections = sqlite_connections.ThreadConnections(path)
+
+    def connect(self):
+        """Return this thread's connection, opening it on first use in each process."""
+        return self.connections.get()
+
+    def init(self):
+        """Create tables and indexes if they don't exist."""
+        conn = self.connect()
+        with conn:
+            conn.execute(f'''CREATE TABLE IF NOT EXISTS practice (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {", ".join(f"{c} TEXT NOT NULL DEFAULT ''" for c in PRACTICE_COLUMNS)})''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_practice_type_clef ON practice (type, clef)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_practice_session ON practice (session_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_practice_timestamp ON practice (timestamp)')
+
+            conn.execute(f'''CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {", ".join(f"{c} TEXT NOT NULL DEFAULT ''" for c in SESSION_COLUMNS)})''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions (start_time)')
+
+            conn.execute(f'''CREATE TABLE IF NOT EXISTS daily_stats (
+                date TEXT PRIMARY KEY,
+                {", ".join(f"{c} TEXT NOT NULL DEFAULT ''" for c in DAILY_STATS_COLUMNS[1:])})''')
+
+    def append_practice(self, rows):
+        """Insert practice rows (lists in PRACTICE_COLUMNS order)."""
+        self._insert('practice', PRACTICE_COLUMNS, rows)
+
+    def append_sessions(self, rows):
+        """Insert session summary rows (lists in SESSION_COLUMNS order)."""
+        self._insert('sessions', SESSION_COLUMNS, rows)
+
+    def replace_daily_stats(self, rows, clear=False):
+        """Insert or overwrite daily stats rows (dicts keyed by DAILY_STATS_COLUMNS)."""
+        if clear:
+            with self.connect() as conn:
+                conn.execute('DELETE FROM daily_stats')
+        self._insert('daily_stats', DAILY_STATS_COLUMNS,
+                     ([row.get(c, '') for c in DAILY_STATS_COLUMNS] for row in rows),
+                     verb='INSERT OR REPLACE')
+
+    def _insert(self, table, columns, rows, verb='INSERT'):
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                f'{verb} INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})',
+                ([str(v) for v in row] for row in rows))
+
+    def practice_reader(self, offset=0):
+        """Reader that tails the practice table by rowid."""
+        return SQLiteTableReader(self, 'practice', PRACTICE_COLUMNS, PracticeRecord._make, offset)
+
+    def sessions_reader(self):
+        """Reader that tails the sessions table by rowid."""
+        return SQLiteTableReader(self, 'sessions', SESSION_COLUMNS, to_session)
+
+    def iter_practice(self):
+        """Stream every practice record in insertion order."""
+        return self.practice_reader().read()
+
+    def iter_history(self, query):
+        """Stream the practice records matching a HistoryQuery, filtered in SQL."""
+        where, params = query.where()
+        cursor = self.connect().execute(
+            f'SELECT {", ".join(PRACTICE_COLUMNS)} FROM practice WHERE {where} ORDER BY id', params)
+        return (PracticeRecord(*row) for row in cursor)
+
+    def iter_sessions(self):
+        """Stream saved session summaries as dicts."""
+        return self._iter_dicts('sessions', SESSION_COLUMNS, 'id')
+
+    def iter_daily_stats(self):
+        """Stream daily stats rows as dicts."""
+        return self._iter_dicts('daily_stats', DAILY_STATS_COLUMNS, 'date')
+
+    def _iter_dicts(self, table, columns, order):
+        cursor = self.connect().execute(f'SELECT {", ".join(columns)} FROM {table} ORDER BY {order}')
+        for row in cursor:
+            yield dict(zip(columns, row))
+
+    def bootstrap(self, views):
+        """Seed views with SQL where a seeder exists, scan rows for the rest; return a reader."""
+        last_id = self.connect().execute('SELECT COALESCE(MAX(id), 0) FROM practice').fetchone()[0]
+
+        scanned = {}
+        for name, view in views.items():
+            seeder = getattr(self, f'_seed_{name}', None)
+            if seeder:
+                seeder(view, last_id)
+            else:
+                scanned[name] = view
+
+        if scanned:
+            for record in self.practice_reader().read(upto=last_id):
+                for view in scanned.values():
+                    view.add(record)
+
+        return self.practice_reader(offset=last_id)
+
+    def _seed_stats(self, stats, last_id):
+        """Seed PracticeStats from indexed aggregate queries."""
+        conn = self.connect()
+        aggregates = conn.execute('''
+            SELECT type, clef, COUNT(*),
+                   SUM(CAST(score AS REAL) = 1),
+                   SUM(CASE WHEN response_time_ms GLOB '[0-9]*' THEN CAST(response_time_ms AS REAL) END),
+                   SUM(response_time_ms GLOB '[0-9]*')
+            FROM practice WHERE id <= ? GROUP BY type, clef''', (last_id,))
+        for practice_type, clef, rows, correct, time_sum, time_count in aggregates:
+            stats.add_aggregate(practice_type, clef, rows, correct or 0, time_sum or 0, time_count or 0)
+
+        recent = conn.execute(
+            f'''SELECT {", ".join(PRACTICE_COLUMNS)} FROM practice
+                WHERE id <= ? AND type != 'session_start' ORDER BY id DESC LIMIT ?''',
+            (last_id, stats.recent.maxlen)).fetchall()
+        stats.recent.extend(PracticeRecord(*row) for row in reversed(recent))
+
+    def _seed_sessions(self, sessions, last_id):
+        """Seed SessionIndex with key practice grouped by session_id, in first-seen order."""
+        cursor = self.connect().execute('''
+            SELECT session_id, COUNT(*),
+                   SUM(CAST(score AS REAL) = 1),
+                   SUM(CASE WHEN response_time_ms GLOB '[0-9]*' THEN CAST(response_time_ms AS REAL) END),
+                   SUM(response_time_ms GLOB '[0-9]*'),
+                   MIN(timestamp), MAX(timestamp)
+            FROM practice WHERE type = 'key_practice' AND id <= ?
+            GROUP BY session_id ORDER BY MIN(id)''', (last_id,))
+        for sid, questions, correct, time_sum, time_count, start_time, end_time in cursor:
+            sessions.add_aggregate(sid, questions, correct or 0, time_sum or 0, time_count or 0,
+                                   start_time, end_time)
+
+    def _seed_keys(self, keys, last_id):
+        """Seed key_sampler.KeyWeights with key practice grouped by clef, answer and notes."""
+        cursor = self.connect().execute('''
+            SELECT clef, correct_answer, notes, COUNT(*),
+                   SUM(CAST(score AS REAL) = 1),
+                   SUM(CASE WHEN response_time_ms GLOB '[0-9]*' THEN CAST(response_time_ms AS REAL) END),
+                   SUM(response_time_ms GLOB '[0-9]*')
+            FROM practice WHERE type = 'key_practice' AND id <= ?
+            GROUP BY clef, correct_answer, notes''', (last_id,))
+        for clef, correct_answer, notes, answers, correct, time_sum, time_count in cursor:
+            keys.add_aggregate(clef, correct_answer, notes, answers, correct or 0,
+                               time_sum or 0, time_count or 0)
+
+
+def open_backend(name, csv_file='data.csv', sessions_file='sessions.csv',
+                 stats_file='daily_stats.csv', sqlite_file='practice.db', archive_dir='archive'):
+    """Return the storage backend selected by name ('csv' or 'sqlite')."""
+    if name == 'sqlite':
+        return SQLiteStorage(sqlite_file)
+    if name == 'csv':
+        return CSVStorage(csv_file, sessions_file, stats_file, archive_dir)
+    raise ValueError(f"Unknown storage backend: {name}")
@@ -0,0 +1,109 @@
+"""Endpoint tests for key practice and exports, run against a throwaway data directory."""
+
+import csv
+import importlib
+import os
+from concurrent.futures import Future
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    # The app keeps its CSV files in the working directory
+    directory = tmp_path_factory.mktemp('app')
+    cwd = os.getcwd()
+    os.chdir(directory)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('LOG_DURABILITY', 'sync')
+        app = importlib.import_module('app')
+        app.wait_for_storage()
+        yield app
+        app.practice_writer.close()
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def new_answers(client, count, answer='C'):
+    questions = client.get(f'/api/key/new?count={count}').get_json()['questions']
+    return [{'answer': answer, 'token': question['token']} for question in questions]
+
+
+def logged_sessions(app_module, answers):
+    """Session ids of the logged rows whose user answer is one of answers."""
+    with open(app_module.CSV_FILE, newline='') as f:
+        return [row[9] for row in csv.reader(f) if row[1] == 'key_practice' and row[6] in answers]
+
+
+def test_batch_rejects_replayed_tokens(client):
+    answers = new_answers(client, 3)
+    result = client.post('/api/key/check-batch', json={'answers': answers + answers[:1]}).get_json()
+    assert (result['accepted'], result['rejected']) == (3, 1)
+    assert result['results'][3] == {'error': 'Question already answered'}
+
+    again = client.post('/api/key/check-batch', json={'answers': answers[1:]}).get_json()
+    assert (again['accepted'], again['rejected']) == (0, 2)
+    response = client.post('/api/key/check', json=answers[2])
+    assert response.status_code == 400
+
+
+def test_failed_write_lets_the_batch_be_sent_again(client, app_module, monkeypatch):
+    answers = new_answers(client, 2, answer='write-failed')
+
+    def fail(rows):
+        raise OSError('disk full')
+    with monkeypatch.context() as patch:
+        patch.setattr(app_module.practice_writer, 'extend', fail)
+        assert client.post('/api/key/check-batch', json={'answers': answers}).status_code == 500
+
+    assert client.post('/api/key/check-batch', json={'answers': answers}).get_json()['accepted'] == 2
+    assert len(logged_sessions(app_module, {'write-failed'})) == 2
+
+
+def test_failed_summary_keeps_the_saved_answers(client, app_module, monkeypatch):
+    answers = new_answers(client, 10, answer='summary-failed')
+
+    def fail(rows):
+        raise OSError('disk full')
+    with monkeypatch.context() as patch:
+        patch.setattr(app_module.backend, 'append_sessions', fail)
+        response = client.post('/api/key/check-batch', json={'answers': answers})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['accepted'] == 10 and result['summary_error'] == 'disk full'
+
+    # A resend is rejected, so the answers are logged once, in one session
+    assert client.post('/api/key/check-batch', json={'answers': answers}).get_json()['accepted'] == 0
+    sessions = logged_sessions(app_module, {'summary-failed'})
+    assert len(sessions) == 10 and len(set(sessions)) == 1
+
+
+def test_non_string_answer_is_graded_and_spends_the_token_once(client):
+    [answer] = new_answers(client, 1)
+    response = client.post('/api/key/check', json=dict(answer, answer=5))
+    assert response.status_code == 200
+    assert response.get_json()['user_answer'] == '5'
+
+    response = client.post('/api/key/check', json=dict(answer, answer=5))
+    assert response.get_json() == {'error': 'Question already answered'}
+
+
+@pytest.mark.parametrize('body', [{'difficulty': ['x']}, {'clef': {'a': 1}}, {'format': ['zip']},
+                                  {'count': 'many'}, {'seed': 'abc'}])
+def test_bulk_export_rejects_malformed_fields(client, body):
+    response = client.post('/api/melody/bulk-export', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_bulk_export_timeout_has_its_own_error(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'EXPORT_TIMEOUT', 0.01)
+    monkeypatch.setattr(app_module.pdf_exports, 'run', lambda *args: Future())
+    response = client.post('/api/melody/bulk-export', json={'count': 1})
+
+    assert response.status_code == 504
+    assert response.get_json() == {'error': 'Export took longer than 0.01 seconds'}
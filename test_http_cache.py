@@ -0,0 +1,107 @@
+"""Tests for the ETag response cache."""
+
+import gzip
+
+import pytest
+from flask import Flask, jsonify
+
+from http_cache import ResponseCache
+
+
+@pytest.fixture
+def site():
+    """A Flask app with cached views over a mutable data version and client value."""
+    state = {'version': 1, 'client': 'a', 'calls': 0, 'status': 200}
+    cache = ResponseCache(version=lambda: state['version'], maxsize=2, min_compress_size=100)
+    app = Flask(__name__)
+
+    @app.route('/small')
+    @cache.cached()
+    def small():
+        state['calls'] += 1
+        if state['status'] != 200:
+            return jsonify({'error': 'failed'}), state['status']
+        return jsonify({'version': state['version']})
+
+    @app.route('/large')
+    @cache.cached(vary=lambda: state['client'])
+    def large():
+        state['calls'] += 1
+        return jsonify({'client': state['client'], 'rows': list(range(200))})
+
+    state['cache'] = cache
+    state['client_app'] = app.test_client()
+    return state
+
+
+def test_repeat_request_with_etag_is_not_modified(site):
+    client = site['client_app']
+    first = client.get('/small')
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'no-cache'
+    etag = first.headers['ETag']
+
+    again = client.get('/small', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.headers['ETag'] == etag
+    assert site['calls'] == 1 and site['cache'].not_modified == 1
+
+    # A cached body is reused without calling the view
+    assert client.get('/small').get_json() == {'version': 1}
+    assert site['calls'] == 1 and site['cache'].hits == 1
+
+
+def test_new_data_version_changes_the_etag(site):
+    client = site['client_app']
+    etag = client.get('/small').headers['ETag']
+    site['version'] = 2
+
+    response = client.get('/small', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert response.get_json() == {'version': 2}
+
+
+def test_vary_values_get_their_own_etag_and_vary_on_cookie(site):
+    client = site['client_app']
+    first = client.get('/large')
+    assert 'Cookie' in first.headers['Vary'] and 'Accept-Encoding' in first.headers['Vary']
+
+    site['client'] = 'b'
+    second = client.get('/large', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200 and second.get_json()['client'] == 'b'
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert 'Cookie' not in client.get('/small').headers.get('Vary', '')
+
+
+def test_large_bodies_are_compressed_under_their_own_etag(site):
+    client = site['client_app']
+    plain = client.get('/large')
+    compressed = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+
+    # Either representation's ETag means the client is up to date
+    response = client.get('/large', headers={'If-None-Match': compressed.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_errors_are_not_cached(site):
+    client = site['client_app']
+    site['status'] = 500
+    assert client.get('/small').status_code == 500
+    assert 'ETag' not in client.get('/small').headers
+    assert site['calls'] == 2 and len(site['cache'].entries) == 0
+
+
+def test_least_recently_used_entry_is_evicted(site):
+    client = site['client_app']
+    for version in (1, 2, 3):
+        site['version'] = version
+        client.get('/small')
+    assert len(site['cache'].entries) == 2
+
+    site['version'] = 1
+    client.get('/small')
+    assert site['calls'] == 4
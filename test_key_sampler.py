@@ -0,0 +1,120 @@
+"""Tests for the Fenwick tree and the weakness-weighted key sampler."""
+
+import os
+import random
+
+import pytest
+
+from key_sampler import MAX_SLOWNESS, MIN_WEIGHT, TARGET_RESPONSE_MS, FenwickTree, KeyWeights
+from practice_log import PracticeRecord
+
+
+def tree_of(weights):
+    tree = FenwickTree(len(weights))
+    for i, weight in enumerate(weights):
+        tree.add(i, weight)
+    return tree
+
+
+@pytest.mark.parametrize('weights', [[1.0], [1.0, 2.0, 3.0], [0.5, 0.0, 2.0, 1.5, 0.0, 3.0, 1.0]])
+def test_find_maps_each_target_to_the_weight_covering_it(weights):
+    tree = tree_of(weights)
+    assert tree.total() == pytest.approx(sum(weights))
+
+    start = 0.0
+    for i, weight in enumerate(weights):
+        if weight:
+            assert tree.find(start) == i
+            assert tree.find(start + weight * 0.999) == i
+        start += weight
+
+
+def test_updates_move_the_sampled_ranges():
+    tree = tree_of([1.0, 1.0, 1.0])
+    tree.add(1, -1.0)
+    tree.add(2, 3.0)
+
+    assert tree.total() == pytest.approx(5.0)
+    assert tree.find(0.5) == 0
+    assert tree.find(1.0) == 2
+
+
+def answer(note, correct, response_time_ms='1000', clef='treble', octave=4):
+    return PracticeRecord(type='key_practice', score='1' if correct else '0', clef=clef,
+                          correct_answer=note, response_time_ms=response_time_ms,
+                          notes=f'Octave: {octave}')
+
+
+def test_weights_start_at_the_uniform_priors():
+    weights = KeyWeights()
+    assert weights.tree.total() == pytest.approx((MIN_WEIGHT + 0.5) * sum(weights.priors))
+    for i, prior in enumerate(weights.priors):
+        assert weights.weights[i] == pytest.approx(prior * (MIN_WEIGHT + 0.5))
+
+
+def test_misses_and_slow_answers_raise_a_weight():
+    weights = KeyWeights()
+    i = weights.lookup('treble', 'C', 'Octave: 4')
+    prior = weights.priors[i]
+
+    weights.add(answer('C', correct=False))
+    assert weights.weights[i] == pytest.approx(prior * (MIN_WEIGHT + 2 / 3))
+
+    # A fast answer never lowers the weight below its error rate
+    weights.add(answer('C', correct=True, response_time_ms='10'))
+    assert weights.weights[i] == pytest.approx(prior * (MIN_WEIGHT + 2 / 4))
+
+    weights.add(answer('C', correct=True, response_time_ms=str(TARGET_RESPONSE_MS * 100)))
+    assert weights.weights[i] == pytest.approx(prior * (MIN_WEIGHT + 2 / 5 * MAX_SLOWNESS))
+    assert weights.tree.total() == pytest.approx(sum(weights.weights))
+
+
+def test_aggregates_match_folded_answers():
+    answers = [answer('F#', True, '2500', clef='bass', octave=3), answer('F#', False, '', clef='bass', octave=3),
+               answer('F#', False, '4000', clef='bass', octave=3)]
+    folded, aggregated = KeyWeights(), KeyWeights()
+    for record in answers:
+        folded.add(record)
+    aggregated.add_aggregate('bass', 'F#', 'Octave: 3', 3, 1, 6500.0, 2)
+
+    assert aggregated.weights == pytest.approx(folded.weights)
+
+
+def test_unknown_rows_are_ignored():
+    weights = KeyWeights()
+    before = list(weights.weights)
+    weights.add(PracticeRecord(type='key_practice', score='0', notes='Key: C, Answer: D'))
+    weights.add(answer('C', correct=False, octave=99))
+    weights.add(PracticeRecord(type='sight_reading_generated', score='1'))
+
+    assert weights.weights == before
+
+
+def test_sample_favours_missed_questions():
+    weights = KeyWeights(rng=random.Random(7))
+    i = weights.lookup('treble', 'G', 'Octave: 5')
+    for _ in range(200):
+        weights.add(answer('G', correct=False, response_time_ms='9000', octave=5))
+
+    draws = [weights.sample() for _ in range(20000)]
+    share = draws.count(weights.items[i]) / len(draws)
+    assert share == pytest.approx(weights.weights[i] / weights.tree.total(), abs=0.005)
+    assert share > 3 * weights.priors[i]
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+def test_forked_workers_draw_different_questions():
+    weights = KeyWeights()
+    streams = []
+    for _ in range(2):
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write_end, repr([weights.sample() for _ in range(20)]).encode())
+            os._exit(0)
+        os.close(write_end)
+        with os.fdopen(read_end) as f:
+            streams.append(f.read())
+        os.waitpid(pid, 0)
+
+    assert streams[0] != streams[1]
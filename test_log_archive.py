@@ -0,0 +1,90 @@
+"""Tests for the columnar practice log archive and rotation."""
+
+import csv
+import math
+from datetime import datetime
+
+import log_archive
+from log_archive import Archive, Segment, rotate, write_segment
+from practice_log import PRACTICE_COLUMNS, PracticeLogReader, PracticeRecord
+from stats_engine import SessionIndex
+
+
+def record(day, n, session_id='s1', score='1', response_time_ms='1200', record_type='key_practice'):
+    return PracticeRecord(f'2025-01-{day:02d}T10:00:{n:02d}', record_type, score, 'beginner', 'treble',
+                          'C', 'C', '', '', session_id, response_time_ms, 'Octave: 4')
+
+
+RECORDS = [
+    record(1, 1),
+    record(1, 2, score='0', response_time_ms=''),
+    record(1, 3, session_id='s2', response_time_ms='950.5'),
+    record(2, 1, record_type='sight_reading_generated', response_time_ms='0'),
+]
+
+
+def test_segment_round_trip(tmp_path):
+    path = write_segment(iter(RECORDS), str(tmp_path / 'archive'))
+    segment = Segment(path)
+
+    assert len(segment) == len(RECORDS)
+    assert list(segment.iter_records()) == RECORDS
+    assert segment.record(2) == RECORDS[2]
+    assert (segment.first_timestamp, segment.last_timestamp) == (RECORDS[0].timestamp, RECORDS[-1].timestamp)
+    times = list(segment.numeric('response_time_ms'))
+    assert times[0] == 1200 and math.isnan(times[1]) and times[2] == 950.5
+
+
+def test_empty_segment_is_not_written(tmp_path):
+    assert write_segment(iter([]), str(tmp_path / 'archive')) is None
+    assert not (tmp_path / 'archive').exists()
+
+
+def test_aggregates_match_with_and_without_numpy(tmp_path, monkeypatch):
+    segment = Segment(write_segment(iter(RECORDS), str(tmp_path / 'archive')))
+    key_practice = segment.dictionaries['type'].index('key_practice')
+    treble = segment.dictionaries['clef'].index('treble')
+
+    vectorized = segment.aggregates()
+    monkeypatch.setattr(log_archive, 'optional_numpy', lambda: None)
+    assert segment.aggregates() == vectorized
+    assert vectorized[(key_practice, treble)] == (3, 2, 2150.5, 2)
+
+
+def test_seeded_sessions_match_folded_rows(tmp_path):
+    archive_dir = str(tmp_path / 'archive')
+    write_segment(iter(RECORDS[:2]), archive_dir)
+    write_segment(iter(RECORDS[2:]), archive_dir)
+    archive = Archive(archive_dir)
+    assert list(archive.iter_records()) == RECORDS
+
+    seeded, folded = SessionIndex(min_questions=1), SessionIndex(min_questions=1)
+    archive.seed_sessions(seeded)
+    for row in RECORDS:
+        folded.add(row)
+    assert seeded.page() == folded.page()
+
+
+def test_rotate_archives_closed_rows_and_keeps_the_rest(tmp_path):
+    csv_file = tmp_path / 'data.csv'
+    with open(csv_file, 'w', newline='') as f:
+        csv.writer(f).writerows([PRACTICE_COLUMNS, *RECORDS])
+    archive_dir = str(tmp_path / 'archive')
+
+    assert rotate(str(csv_file), archive_dir, keep_days=1, now=datetime(2025, 1, 3)) == 3
+    assert list(Archive(archive_dir).iter_records()) == RECORDS[:3]
+    assert list(PracticeLogReader(str(csv_file)).read()) == RECORDS[3:]
+    assert csv_file.read_text().splitlines()[0] == ','.join(PRACTICE_COLUMNS)
+
+    # Nothing left to archive
+    assert rotate(str(csv_file), archive_dir, keep_days=1, now=datetime(2025, 1, 3)) == 0
+    assert len(Archive(archive_dir).segments) == 1
+
+
+def test_rotate_skips_files_under_max_bytes(tmp_path):
+    csv_file = tmp_path / 'data.csv'
+    with open(csv_file, 'w', newline='') as f:
+        csv.writer(f).writerows([PRACTICE_COLUMNS, *RECORDS])
+
+    assert rotate(str(csv_file), str(tmp_path / 'archive'), keep_days=0, max_bytes=1 << 20) == 0
+    assert rotate(str(tmp_path / 'missing.csv'), str(tmp_path / 'archive')) == 0
@@ -0,0 +1,149 @@
+"""Tests for the write-behind practice log writer."""
+
+import threading
+import time
+
+import pytest
+
+from log_writer import PracticeLogWriter
+
+
+class Sink:
+    """write_rows stand-in recording each batch; fails the next `failures` writes."""
+
+    def __init__(self, delay=0.0):
+        self.batches = []
+        self.failures = 0
+        self.delay = delay
+
+    def __call__(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise OSError('disk full')
+        time.sleep(self.delay)
+        self.batches.append(list(rows))
+
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+
+def batched(sink, **kwargs):
+    # A long delay keeps the background flusher out of the way
+    return PracticeLogWriter(sink, mode='batched', max_rows=10000, max_delay_ms=60000, **kwargs)
+
+
+def test_rows_are_queued_until_flush():
+    sink = Sink()
+    flushed = []
+    writer = batched(sink, on_flush=lambda: flushed.append(len(sink.rows)))
+    writer.append('a')
+    writer.extend(['b', 'c'])
+    assert sink.batches == [] and writer.metrics()['queue_depth'] == 3
+
+    writer.flush()
+    assert sink.batches == [['a', 'b', 'c']]
+    assert flushed == [3]
+    writer.close()
+
+
+def test_concurrent_flushes_keep_queue_order():
+    sink = Sink(delay=0.001)
+    writer = batched(sink)
+    missing = []
+
+    def produce(name):
+        for i in range(50):
+            writer.append((name, i))
+            writer.flush()
+            # A flush returns only once every row queued before it is written
+            if (name, i) not in sink.rows:
+                missing.append((name, i))
+
+    threads = [threading.Thread(target=produce, args=(name,)) for name in 'abcd']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert missing == []
+    for name in 'abcd':
+        assert [i for producer, i in sink.rows if producer == name] == list(range(50))
+    writer.close()
+
+
+def test_flush_waits_for_rows_another_flush_is_writing():
+    sink = Sink()
+    writing, release = threading.Event(), threading.Event()
+
+    def slow_write(rows):
+        writing.set()
+        release.wait(5)
+        sink(rows)
+
+    writer = batched(slow_write)
+    writer.append('a')
+    first = threading.Thread(target=writer.flush)
+    first.start()
+    assert writing.wait(5)
+
+    # The queue is empty now, but 'a' isn't written yet, so this flush must wait
+    second = threading.Thread(target=writer.flush)
+    second.start()
+    second.join(0.2)
+    assert second.is_alive()
+
+    release.set()
+    first.join()
+    second.join()
+    assert sink.rows == ['a']
+    writer.close()
+
+
+def test_failed_write_requeues_rows_in_front():
+    sink = Sink()
+    writer = batched(sink)
+    writer.extend(['a', 'b'])
+    sink.failures = 1
+
+    writer.flush()
+    assert sink.batches == []
+    assert writer.metrics()['queue_depth'] == 2 and writer.flush_errors == 1
+
+    writer.append('c')
+    writer.flush()
+    assert sink.batches == [['a', 'b', 'c']]
+    writer.close()
+
+
+def test_sync_mode_writes_each_extend_in_one_call():
+    sink = Sink()
+    writer = PracticeLogWriter(sink, mode='sync')
+    writer.extend(['a', 'b'])
+    writer.append('c')
+    writer.extend([])
+    assert sink.batches == [['a', 'b'], ['c']]
+
+    sink.failures = 1
+    with pytest.raises(OSError):
+        writer.append('d')
+    assert sink.rows == ['a', 'b', 'c'] and writer.flush_errors == 1
+
+
+def test_close_flushes_and_later_rows_are_written_directly():
+    sink = Sink()
+    writer = batched(sink)
+    writer.extend(['a', 'b'])
+    writer.close()
+    assert sink.batches == [['a', 'b']]
+
+    writer.append('c')
+    assert sink.batches == [['a', 'b'], ['c']]
+    sink.failures = 1
+    with pytest.raises(OSError):
+        writer.append('d')
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        PracticeLogWriter(Sink(), mode='eventually')
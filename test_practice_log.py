@@ -0,0 +1,103 @@
+"""Tests for the streaming practice log reader and its byte-offset checkpoints."""
+
+import csv
+
+from practice_log import PRACTICE_COLUMNS, PracticeLogReader, to_record
+
+
+def row(n, notes='Octave: 4'):
+    return [f'2025-01-01T10:00:{n:02d}', 'key_practice', '1', 'beginner', 'treble',
+            'C', 'C', '', '', 'abc', '1200', notes]
+
+
+def write_rows(path, rows, mode='a'):
+    with open(path, mode, newline='') as f:
+        csv.writer(f).writerows(rows)
+
+
+def test_read_resumes_from_checkpoint(tmp_path):
+    path = tmp_path / 'data.csv'
+    write_rows(path, [PRACTICE_COLUMNS, row(1), row(2)], mode='w')
+    reader = PracticeLogReader(str(path))
+
+    assert [r.timestamp for r in reader.read()] == ['2025-01-01T10:00:01', '2025-01-01T10:00:02']
+    assert reader.offset == path.stat().st_size
+    assert not reader.has_new_rows()
+    assert list(reader.read()) == []
+
+    write_rows(path, [row(3)])
+    assert [r.timestamp for r in reader.read()] == ['2025-01-01T10:00:03']
+
+
+def test_reader_starting_at_offset_skips_earlier_rows(tmp_path):
+    path = tmp_path / 'data.csv'
+    write_rows(path, [PRACTICE_COLUMNS, row(1)], mode='w')
+    offset = path.stat().st_size
+    write_rows(path, [row(2)])
+
+    assert [r.timestamp for r in PracticeLogReader(str(path), offset).read()] == ['2025-01-01T10:00:02']
+
+
+def test_partial_last_line_is_left_for_next_read(tmp_path):
+    path = tmp_path / 'data.csv'
+    write_rows(path, [PRACTICE_COLUMNS, row(1)], mode='w')
+    with open(path, 'a') as f:
+        f.write('2025-01-01T10:00:02,key_practice,1')
+    reader = PracticeLogReader(str(path))
+
+    assert [r.timestamp for r in reader.read()] == ['2025-01-01T10:00:01']
+    checkpoint = reader.offset
+    assert checkpoint < path.stat().st_size
+
+    with open(path, 'a', newline='') as f:
+        f.write(',beginner,treble,C,C,,,abc,900,Octave: 4\r\n')
+    records = list(reader.read())
+    assert [(r.timestamp, r.response_time_ms) for r in records] == [('2025-01-01T10:00:02', '900')]
+    assert reader.offset == path.stat().st_size
+
+
+def test_stopping_early_keeps_offset_after_last_yielded_row(tmp_path):
+    path = tmp_path / 'data.csv'
+    write_rows(path, [PRACTICE_COLUMNS, row(1), row(2), row(3)], mode='w')
+    reader = PracticeLogReader(str(path))
+
+    rows = reader.read()
+    assert next(rows).timestamp == '2025-01-01T10:00:01'
+    rows.close()
+    assert [r.timestamp for r in reader.read()] == ['2025-01-01T10:00:02', '2025-01-01T10:00:03']
+
+
+def test_truncated_file_is_read_from_the_start(tmp_path):
+    path = tmp_path / 'data.csv'
+    write_rows(path, [PRACTICE_COLUMNS, row(1), row(2)], mode='w')
+    reader = PracticeLogReader(str(path))
+    list(reader.read())
+
+    write_rows(path, [PRACTICE_COLUMNS, row(9)], mode='w')
+    assert [r.timestamp for r in reader.read()] == ['2025-01-01T10:00:09']
+
+
+def test_quoted_notes_with_commas_survive(tmp_path):
+    path = tmp_path / 'data.csv'
+    write_rows(path, [PRACTICE_COLUMNS, row(1, notes='Octave: 4, retry')], mode='w')
+
+    assert [r.notes for r in PracticeLogReader(str(path)).read()] == ['Octave: 4, retry']
+
+
+def test_missing_file_has_no_rows(tmp_path):
+    reader = PracticeLogReader(str(tmp_path / 'missing.csv'))
+    assert not reader.has_new_rows()
+    assert list(reader.read()) == []
+
+
+def test_to_record_handles_older_schemas():
+    current = to_record(row(1))
+    assert current.response_time_ms == '1200' and current.notes == 'Octave: 4'
+
+    before_response_time = to_record(row(1)[:10] + ['Octave: 4'])
+    assert before_response_time.response_time_ms == '' and before_response_time.notes == 'Octave: 4'
+
+    legacy = to_record(['2024-01-01T09:00:00', 'key_practice', '0', 'beginner', 'Key: E', ' Answer: F'])
+    assert (legacy.correct_answer, legacy.user_answer) == ('E', 'F')
+
+    assert to_record(['too', 'short']) is None
@@ -0,0 +1,64 @@
+"""Tests for signed key practice question tokens."""
+
+import time
+
+import pytest
+
+from question_tokens import InvalidToken, QuestionSigner
+
+KEY = {'note': 'F', 'accidental': '#', 'clef': 'bass', 'octave': 3}
+
+
+def test_issued_token_verifies():
+    signer = QuestionSigner('secret')
+    issued_at = time.time() - 5
+    key, token_issued_at = signer.verify(signer.issue(KEY, issued_at))
+
+    assert key == ('F', '#', 'bass', 3)
+    assert token_issued_at == pytest.approx(issued_at, abs=0.001)
+
+
+def test_natural_key_round_trips():
+    signer = QuestionSigner(b'secret')
+    assert signer.verify(signer.issue(dict(KEY, note='C', accidental='')))[0] == ('C', '', 'bass', 3)
+
+
+@pytest.mark.parametrize('tamper', [
+    lambda token: token.replace('.bass.', '.treble.'),
+    lambda token: token.replace('F#', 'G#'),
+    lambda token: token[:-2] + ('AA' if not token.endswith('AA') else 'BB'),
+    lambda token: token.rpartition('.')[0],
+    lambda token: 'garbage',
+    lambda token: '',
+    lambda token: None,
+])
+def test_tampered_tokens_are_rejected(tamper):
+    signer = QuestionSigner('secret')
+    with pytest.raises(InvalidToken, match='Invalid'):
+        signer.verify(tamper(signer.issue(KEY)))
+
+
+def test_tokens_from_another_secret_are_rejected():
+    with pytest.raises(InvalidToken):
+        QuestionSigner('secret').verify(QuestionSigner('other').issue(KEY))
+
+
+def test_expired_tokens_are_rejected():
+    signer = QuestionSigner('secret', ttl=60)
+    token = signer.issue(KEY, time.time() - 120)
+
+    with pytest.raises(InvalidToken, match='expired'):
+        signer.verify(token)
+    # A longer ttl, as for answers synced later, still accepts it
+    assert signer.verify(token, ttl=3600)[0] == ('F', '#', 'bass', 3)
+    with pytest.raises(InvalidToken, match='expired'):
+        signer.verify(token, ttl=30)
+
+
+def test_tokens_for_the_same_question_and_time_differ():
+    signer = QuestionSigner('secret')
+    issued_at = time.time()
+    first, second = signer.issue(KEY, issued_at), signer.issue(KEY, issued_at)
+
+    assert first != second
+    assert signer.verify(first) == signer.verify(second)
@@ -0,0 +1,31 @@
+"""Tests for the keyed state stores."""
+
+import pytest
+
+from state_store import MemoryStore, SQLiteStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    def make(ttl=60):
+        if request.param == 'sqlite':
+            return SQLiteStore(str(tmp_path / 'state.db'), table='used', ttl=ttl)
+        return MemoryStore(ttl=ttl)
+    return make
+
+
+def test_add_stores_a_key_once(make_store):
+    store = make_store()
+    assert store.add('abc', 1)
+    assert not store.add('abc', 2)
+    assert store.get('abc') == 1
+
+    store.pop('abc')
+    assert store.add('abc', 3)
+
+
+def test_add_replaces_an_expired_value(make_store):
+    store = make_store(ttl=-1)
+    assert store.add('abc', 1)
+    assert store.add('abc', 2)
+    assert store.get('abc') is None
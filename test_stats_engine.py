@@ -0,0 +1,141 @@
+"""Tests for the in-memory practice views."""
+
+import pytest
+
+from practice_log import PracticeRecord
+from stats_engine import DailyRollup, GraphSeries, SessionCounters, SessionIndex, lttb
+
+
+def answer(timestamp, session_id):
+    return PracticeRecord(timestamp=timestamp, type='key_practice', score='1', session_id=session_id)
+
+
+def test_practice_minutes_are_counted_per_session():
+    rollup = DailyRollup()
+    # Two students answering every minute for five minutes, half a minute apart
+    for minute in range(6):
+        rollup.add(answer(f'2025-01-01T10:{minute:02d}:00', 'a'))
+        rollup.add(answer(f'2025-01-01T10:{minute:02d}:30', 'b'))
+    # An earlier session synced afterwards still counts its own gaps
+    for minute in range(3):
+        rollup.add(answer(f'2025-01-01T09:{minute:02d}:00', 'c'))
+
+    [day] = rollup.range()
+    assert day['practice_time_minutes'] == 12.0
+    assert day['total_sessions'] == 3
+    assert day['total_questions'] == 15
+
+
+def test_idle_gaps_are_not_practice_time():
+    rollup = DailyRollup()
+    rollup.add(answer('2025-01-01T10:00:00', 'a'))
+    rollup.add(answer('2025-01-01T10:01:00', 'a'))
+    rollup.add(answer('2025-01-01T11:00:00', 'a'))
+
+    assert rollup.range()[0]['practice_time_minutes'] == 1.0
+
+
+def test_session_counters_summarize_and_round_trip():
+    counters = SessionCounters('abc', '2025-01-01T10:00:00')
+    for correct, response_time in [(True, 1000), (False, 2000), (True, 1500)]:
+        counters.add(correct, response_time)
+
+    assert (counters.accuracy(), counters.avg_response_time()) == (66.7, 1500)
+    assert SessionCounters.from_list(counters.to_list()).to_list() == counters.to_list()
+
+
+def saved(session_id):
+    return {'session_id': session_id, 'start_time': '2025-01-01T09:00:00', 'total_questions': '10'}
+
+
+def session_index(*answers_per_session):
+    """SessionIndex listing sessions with at least 2 answers, fed answers_per_session answers."""
+    index = SessionIndex(min_questions=2)
+    for n, answers in enumerate(answers_per_session):
+        for i in range(answers):
+            index.add(answer(f'2025-01-01T10:{n:02d}:{i:02d}', f's{n}'))
+    return index
+
+
+def test_session_page_lists_sessions_in_first_seen_order():
+    index = session_index(3, 1, 2)
+    sessions, next_after = index.page()
+
+    # s1 is too short to list
+    assert [s['session_id'] for s in sessions] == ['s0', 's2']
+    assert next_after is None
+    assert sessions[0]['total_questions'] == 3 and sessions[0]['accuracy'] == 100.0
+
+
+def test_saved_summary_replaces_the_live_session():
+    index = session_index(3, 1)
+    index.add_saved(saved('s1'))
+    index.add_saved(saved('later'))
+
+    sessions, _ = index.page()
+    assert [s['session_id'] for s in sessions] == ['s0', 's1', 'later']
+    assert sessions[1] == saved('s1')
+
+
+def test_session_pages_follow_next_after():
+    index = session_index(2, 2, 2, 2, 2)
+    first, after = index.page(limit=2)
+    second, after_second = index.page(after=after, limit=2)
+    third, end = index.page(after=after_second, limit=2)
+
+    assert [[s['session_id'] for s in page] for page in (first, second, third)] == [
+        ['s0', 's1'], ['s2', 's3'], ['s4']]
+    assert (after, after_second, end) == ('s1', 's3', None)
+    with pytest.raises(KeyError):
+        index.page(after='unknown')
+
+
+def graph_of(*sessions):
+    graph = GraphSeries()
+    for start_time, accuracy, response_time in sessions:
+        graph.add({'start_time': start_time, 'accuracy': str(accuracy), 'avg_response_time': str(response_time)})
+    return graph
+
+
+def test_graph_points_are_ordered_by_date_and_windowed():
+    graph = graph_of(('2025-01-06T10:00:00', 60, 2000), ('2025-01-01T10:00:00', 80, 1000),
+                     ('2025-01-07T10:00:00', 90, 1500))
+
+    assert [(p['date'], p['session']) for p in graph.query()] == [
+        ('2025-01-01', 2), ('2025-01-06', 1), ('2025-01-07', 3)]
+    assert [p['date'] for p in graph.query(start='2025-01-02', end='2025-01-06')] == ['2025-01-06']
+
+
+def test_graph_groups_average_sessions_per_day_and_week():
+    graph = graph_of(('2025-01-06T10:00:00', 60, 2000), ('2025-01-06T11:00:00', 80, 1000),
+                     ('2025-01-08T10:00:00', 100, 1500), ('2025-01-13T10:00:00', 50, 500))
+
+    assert graph.query(group='day', end='2025-01-06') == [
+        {'date': '2025-01-06', 'sessions': 2, 'accuracy': 70.0, 'response_time': 1500}]
+    assert [(p['date'], p['sessions'], p['accuracy']) for p in graph.query(group='week')] == [
+        ('2025-01-06', 3, 80.0), ('2025-01-13', 1, 50.0)]
+
+
+def test_graph_queries_are_recomputed_after_a_new_session():
+    graph = graph_of(('2025-01-01T10:00:00', 80, 1000))
+    assert len(graph.query()) == 1
+    graph.add({'start_time': '2025-01-02T10:00:00', 'accuracy': '90', 'avg_response_time': '900'})
+    assert len(graph.query()) == 2
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    values = [0.0] * 100
+    values[37], values[71] = 100.0, -50.0
+    points = [{'i': i, 'y': y} for i, y in enumerate(values)]
+
+    sampled = lttb(points, 10, key=lambda p: p['y'])
+    assert len(sampled) == 10
+    assert sampled[0] is points[0] and sampled[-1] is points[-1]
+    assert points[37] in sampled and points[71] in sampled
+    assert [p['i'] for p in sampled] == sorted(p['i'] for p in sampled)
+
+
+def test_lttb_returns_short_series_unchanged():
+    points = [{'y': y} for y in range(5)]
+    assert lttb(points, 5, key=lambda p: p['y']) == points
+    assert lttb(points, 2, key=lambda p: p['y']) == points
@@ -0,0 +1,32 @@
+"""Tests for the CSV storage backend."""
+
+from storage import CSVStorage
+
+DAY = {'date': '2025-01-01', 'total_sessions': 1, 'total_questions': 10, 'accuracy': 80.0,
+       'avg_response_time': 1500.0, 'practice_time_minutes': 4.5}
+
+
+def csv_storage(tmp_path):
+    storage = CSVStorage(str(tmp_path / 'data.csv'), str(tmp_path / 'sessions.csv'),
+                         str(tmp_path / 'daily_stats.csv'), archive_dir=str(tmp_path / 'archive'))
+    storage.init()
+    return storage
+
+
+def test_daily_stats_are_merged_by_date(tmp_path):
+    storage = csv_storage(tmp_path)
+    storage.replace_daily_stats([DAY, dict(DAY, date='2025-01-02')])
+    storage.replace_daily_stats([dict(DAY, total_questions=12)])
+
+    assert [(row['date'], row['total_questions']) for row in storage.iter_daily_stats()] == [
+        ('2025-01-01', '12'), ('2025-01-02', '10')]
+
+
+def test_unchanged_daily_stats_leave_the_file_alone(tmp_path):
+    storage = csv_storage(tmp_path)
+    storage.replace_daily_stats([DAY])
+    before = (tmp_path / 'daily_stats.csv').stat()
+
+    storage.replace_daily_stats([DAY])
+    after = (tmp_path / 'daily_stats.csv').stat()
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)